@@ -1,6 +1,7 @@
+import collections
+import os
 import random
 from util import *
-from planner import *
 
 """
 Controller (base)
@@ -108,12 +109,159 @@ class Controller_Heuristic(Controller_Counter):
         options.sort()
         return (Steering(options[0][2]), 1)
 
+"""
+Controller that explores toward the nearest useful frontier
+- frontier cells are mapped cells with an opening to an unmapped cell, kept in
+  a set that is updated around the newly mapped cell on each step
+- the route to the nearest frontier goes over the mapped cells, moving up to
+  3 cells at a time along its straight parts (the sensors confirm the way is
+  clear) and one cell at a time into unmapped cells
+- once the goal is found, a frontier is only useful if a path through it could
+  be shorter than the best known path - it resets when none is left
+"""
+class Controller_Frontier(Controller_Heuristic):
+    def __init__(self):
+        self.frontier = set()
+        self.targets = set()
+        self.target = None
+        self.goalFound = False
+        self.version = None # (map version, goal found) of the distances
+
+    def canReset(self, robot):
+        self.update(robot)
+        return self.goalFound and len(self.targets)==0
+
+    def search(self, robot):
+        steps = self.route(robot)
+        if steps is None:
+            return Controller_Heuristic.search(self, robot)
+        heading = robot.heading
+        direction = steps[0]
+        movement = 1
+        while movement < min(len(steps), 3) and steps[movement]==direction:
+            movement += 1
+        if movement==len(steps):
+            self.target = None # this move enters the unmapped cell
+        if direction==heading.direction.reverse():
+            return (Steering.F, -movement) # back off along the mapped route
+        return (heading.direction.steer(direction), movement)
+
+    # True for a mapped cell with an opening to an unmapped cell
+    def isFrontier(self, maze, location):
+        return not maze.isUnknown(location) and len(self.unknownDirections(maze, location))>0
+
+    def unknownDirections(self, maze, location):
+        result = []
+        for d in Direction:
+            if maze.canMove(Heading(d, location)):
+                l2 = Heading(d, location).forward().location
+                if maze.isValid(l2) and maze.isUnknown(l2):
+                    result.append(d)
+        return result
+
+    # update the frontier around the robot and the useful frontier cells
+    def update(self, robot):
+        maze = robot.maze
+        location = tuple(robot.heading.location)
+        if robot.goal.isGoal(location):
+            self.goalFound = True
+        for l in [location] + [tuple(Heading(d, location).forward().location) for d in Direction]:
+            if maze.isValid(l) and self.isFrontier(maze, l):
+                self.frontier.add(l)
+            else:
+                self.frontier.discard(l)
+
+        # the distances only change with the map
+        version = (maze.version(), self.goalFound)
+        if version != self.version:
+            self.version = version
+            # lower bound of the distance to the goal (unmapped cells are open)
+            self.goalDistance = distanceField(maze, exact=True)
+            self.best = None
+            if self.goalFound:
+                self.startDistance = distanceField(maze, [robot.start], openUnknown=False, exact=True)
+                rows, cols = maze.shape
+                goals = [self.startDistance[r, c] for r in range(rows) for c in range(cols)
+                         if robot.goal.isGoal((r, c)) and self.startDistance[r, c]>=0]
+                if len(goals)>0:
+                    self.best = min(goals)
+
+        self.targets = self.frontier
+        if self.best is not None:
+            startDistance = self.startDistance
+            self.targets = set(l for l in self.frontier
+                               if startDistance[l]>=0 and startDistance[l] + self.goalDistance[l] < self.best)
+
+    # directions to the best target over mapped cells plus the step into the unmapped cell
+    # - before the goal is found: the least route distance plus distance to the goal
+    # - after that: the nearest useful frontier
+    # - the target is kept until the robot steps from it or it is no longer useful
+    def route(self, robot):
+        maze = robot.maze
+        start = tuple(robot.heading.location)
+        distance = { start: 0 }
+        parent = { start: None }
+        queue = collections.deque([start])
+        while len(queue)>0:
+            l = queue.popleft()
+            for d in Direction:
+                if maze.canMove(Heading(d, l)):
+                    l2 = tuple(Heading(d, l).forward().location)
+                    if maze.isValid(l2) and not maze.isUnknown(l2) and l2 not in parent:
+                        distance[l2] = distance[l] + 1
+                        parent[l2] = (l, d)
+                        queue.append(l2)
+
+        targets = [l for l in self.targets if l in distance]
+        if len(targets)==0:
+            return None
+        if self.target in targets:
+            l = self.target
+        elif self.goalFound:
+            l = min(targets, key=lambda l: (distance[l], self.goalDistance[l]))
+        else:
+            l = min(targets, key=lambda l: (distance[l] + self.goalDistance[l], distance[l]))
+        self.target = l
+
+        # step into the unmapped cell closest to the goal
+        unknown = self.unknownDirections(maze, l)
+        unknown.sort(key=lambda d: self.goalDistance[tuple(Heading(d, l).forward().location)])
+        steps = [unknown[0]]
+        while parent[l] is not None:
+            l, d = parent[l]
+            steps.append(d)
+        steps.reverse()
+        return steps
+
 """
 Follow the optimal moves given mapped area
+- with a time budget (seconds) in an env var 'PLAN_BUDGET' the moves come
+  from the anytime planner: the best plan found within the budget at reset,
+  refined within the budget on every step until it is optimal
+- otherwise the moves can be given (e.g. planned in the background)
 """
 class Controller_Exploitation(Controller):
-    def __init__(self, robot):
-        self.moves = findOptimalMoves(robot.maze, robot.goal, robot.heuristic)
+    def __init__(self, robot, moves=None):
+        # the planner is only loaded for the 2nd run (or a warm start)
+        from planner import findOptimalMoves, AnytimePlanner
+        try:
+            self.budget = float(os.environ['PLAN_BUDGET'])
+        except:
+            self.budget = None
+        if self.budget is None:
+            self.planner = None
+            if moves is None:
+                moves = findOptimalMoves(robot.maze, robot.goal, robot.heuristic, robot.graph)
+            self.moves = moves
+        else:
+            self.planner = AnytimePlanner(robot.maze, robot.goal)
+            self.planner.plan(self.budget)
+            # the reset step waits for a 1st plan (a step standing still costs more)
+            while self.planner.path is None and not self.planner.done:
+                self.planner.plan(self.budget)
+            self.path = None
+            self.moves = []
+            self.follow(robot.heading, robot.goal)
 
     # this controller is used in 2nd run - can not reset
     def canReset(self, robot):
@@ -121,5 +269,46 @@ class Controller_Exploitation(Controller):
 
     # just follow the moves
     def search(self, robot):
+        planner = self.planner
+        if planner is not None and not planner.done:
+            planner.plan(self.budget)
+        if planner is not None and planner.path is not self.path:
+            self.follow(robot.heading, robot.goal)
+        if len(self.moves)==0:
+            return (Steering.F, 0) # no plan yet
         return self.moves.pop(0)
 
+    # switch to the latest plan when the robot is on its path (and not facing back)
+    def follow(self, heading, goal):
+        from planner import pathMoves
+        path = self.planner.path
+        if path is None:
+            return
+        direction = path.getValue(heading.location)
+        if isinstance(direction, Direction) and direction != heading.direction.reverse():
+            self.moves = pathMoves(path, heading, goal)
+            self.path = path
+
+"""
+Follow the optimal moves on the map restored from a snapshot
+- this controller is used in the 1st run and ends it at the goal
+"""
+class Controller_WarmStart(Controller_Exploitation):
+    def canReset(self, robot):
+        return Controller.canReset(self, robot)
+
+"""
+Controllers available by name (used by the CONTROL env var and the tournament)
+"""
+Controllers = {
+    'random'    : Controller_Random,
+    'deadend'   : Controller_DeadEnd,
+    'deadend2'  : Controller_DeadEnd2,
+    'counter'   : Controller_Counter,
+    'heuristic' : Controller_Heuristic,
+    'frontier'  : Controller_Frontier,
+}
+
+# returns a new controller for the name (the base controller for unknown names)
+def createController(name):
+    return Controllers.get(name, Controller)()
@@ -0,0 +1,61 @@
+from maze import Maze
+from simulator import Simulator, TABLES
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+"""
+Maze corpus in shared memory
+- the mazes are parsed and their Simulator tables (sensor distances, sensor
+  readings, move transitions) are computed once in the parent process and
+  copied into one shared memory block
+- worker processes forked from the parent attach to the block as read-only
+  numpy views: nothing is parsed, computed, copied or pickled per worker or
+  per task (the block can only be inherited, it refuses to be pickled)
+"""
+class SharedCorpus(object):
+    def __init__(self, filenames):
+        self.index = {} # filename => [(name, dtype, shape, offset)]
+        arrays = []
+        size = 0
+        for filename in filenames:
+            maze = Maze(filename)
+            simulator = Simulator(maze)
+            entries = []
+            for name in ['walls'] + TABLES:
+                array = np.ascontiguousarray(maze.walls if name=='walls' else getattr(simulator, name))
+                entries.append((name, array.dtype.str, array.shape, size))
+                arrays.append((size, array))
+                size += (array.nbytes + 7) // 8 * 8 # 8 byte aligned
+            self.index[filename] = entries
+
+        self.block = RawArray('b', max(size, 1))
+        memory = np.frombuffer(self.block, dtype=np.uint8)
+        for offset, array in arrays:
+            memory[offset:offset+array.nbytes] = array.view(np.uint8).ravel()
+        self.loaded = {}
+
+    def __contains__(self, filename):
+        return filename in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    # size of the shared block in bytes
+    def nbytes(self):
+        return len(self.block)
+
+    # name => read-only view of each table of a maze
+    def tables(self, filename):
+        tables = {}
+        for name, dtype, shape, offset in self.index[filename]:
+            view = np.frombuffer(self.block, dtype=dtype, count=int(np.prod(shape)), offset=offset)
+            view.flags.writeable = False
+            tables[name] = view.reshape(shape)
+        return tables
+
+    # (Maze, Simulator) over the views of a maze (created once per process)
+    def load(self, filename):
+        if filename not in self.loaded:
+            tables = self.tables(filename)
+            self.loaded[filename] = (Maze.fromWalls(tables['walls']), Simulator.attach(tables))
+        return self.loaded[filename]
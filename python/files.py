@@ -0,0 +1,20 @@
+import os
+from contextlib import contextmanager
+
+"""
+Replace a file with what is written to the returned file object
+- it is written to a temporary file renamed over the file at the end, so that
+  readers never see a partial file (readers that opened the old file keep it)
+- the temporary file is removed if writing fails
+"""
+@contextmanager
+def replaceFile(filename, mode='wb'):
+    temp = filename + '.tmp'
+    try:
+        with open(temp, mode) as f:
+            yield f
+    except:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    os.rename(temp, filename)
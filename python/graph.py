@@ -0,0 +1,174 @@
+from util import *
+
+"""
+Corridor between two nodes of the junction graph
+- source: the node the edge leaves from in the given direction
+- target: the node the edge arrives at in the arrival direction
+- cells: the cells entered along the way (ending with the target)
+- turns: the number of direction changes inside the corridor
+"""
+class Edge(object):
+    def __init__(self, source, direction, target, arrival, cells, turns):
+        self.source = source
+        self.direction = direction
+        self.target = target
+        self.arrival = arrival
+        self.cells = cells
+        self.turns = turns
+        self.length = len(cells)
+
+    # the A* cost of the edge when arriving at the source in the given direction
+    # (the same as moving cell by cell: 1 per cell plus 1 per direction change)
+    def cost(self, direction):
+        return self.length + self.turns + (0 if direction==self.direction else 1)
+
+    # the moves (of up to 3 cells in a straight line) the edge adds when arriving
+    # at the source in the given direction with run cells (modulo 3) of the last
+    # move, and the run cells after the edge
+    def moves(self, direction, run):
+        moves = 0
+        for location, d in self.steps():
+            if d!=direction or run==0:
+                moves += 1
+                run = 0
+            direction = d
+            run = (run+1) % 3
+        return moves, run
+
+    # (location, direction) of each step along the edge
+    def steps(self):
+        location = self.source
+        for cell in self.cells:
+            delta = [cell[i]-location[i] for i in range(2)]
+            yield location, Direction(Delta.index(delta))
+            location = cell
+
+    def __str__(self):
+        return '({:>2d},{:>2d}) {} => ({:>2d},{:>2d}) {} length={} turns={}'.format(
+            self.source[0], self.source[1], self.direction,
+            self.target[0], self.target[1], self.arrival,
+            self.length, self.turns)
+
+"""
+Junction graph over the mapped cells
+- corridor cells (known cells with exactly two ways to move) are collapsed into
+  weighted edges between the nodes (junctions, dead ends, the start and goal cells)
+- the graph is updated incrementally as each cell is mapped
+"""
+class JunctionGraph(object):
+    def __init__(self, maze, goal, start):
+        self.maze = maze
+        self.goal = goal
+        self.start = tuple(start)
+        self.nodes = set()
+        self.edges = {}   # (node, direction) => Edge
+        self.through = {} # location => keys of the edges touching it
+        rows, cols = maze.shape
+        for r in range(rows):
+            for c in range(cols):
+                if self.isNode((r, c)):
+                    self.nodes.add((r, c))
+        for node in self.nodes:
+            self.walkFrom(node)
+
+    # directions we can move to from a location (into mapped cells only)
+    def exits(self, location):
+        maze = self.maze
+        result = []
+        for d in Direction:
+            if maze.canMove(Heading(d, location)):
+                delta = d.delta()
+                l2 = (location[0]+delta[0], location[1]+delta[1])
+                if maze.isValid(l2) and not maze.isUnknown(l2):
+                    result.append(d)
+        return result
+
+    def isNode(self, location):
+        if self.maze.isUnknown(location):
+            return False
+        return location==self.start or self.goal.isGoal(location) or len(self.exits(location))!=2
+
+    # call this after a cell is (re)mapped
+    def update(self, location):
+        location = tuple(location)
+        affected = [location]
+        for d in Direction:
+            delta = d.delta()
+            l2 = (location[0]+delta[0], location[1]+delta[1])
+            if self.maze.isValid(l2):
+                affected.append(l2)
+
+        # drop every edge touching the affected cells
+        stale = set()
+        for l in affected:
+            stale.update(self.through.get(l, ()))
+        for key in stale:
+            self.removeEdge(key)
+
+        for l in affected:
+            if self.isNode(l):
+                self.nodes.add(l)
+            else:
+                self.nodes.discard(l)
+
+        # walk again from the sources of the dropped edges and the affected nodes
+        sources = set(key[0] for key in stale)
+        sources.update(l for l in affected if l in self.nodes)
+        for node in sources:
+            if node in self.nodes:
+                self.walkFrom(node)
+
+    # add the edges leaving a node (those not already known)
+    def walkFrom(self, node):
+        for d in self.exits(node):
+            if (node, d) not in self.edges:
+                edge = self.walk(node, d)
+                if edge is not None:
+                    self.addEdge(edge)
+
+    # follow the corridor from a node until the next node
+    def walk(self, node, direction):
+        cells = []
+        turns = 0
+        location = node
+        first = direction
+        while True:
+            delta = direction.delta()
+            location = (location[0]+delta[0], location[1]+delta[1])
+            cells.append(location)
+            if location in self.nodes:
+                return Edge(node, first, location, direction, cells, turns)
+            exits = [d for d in self.exits(location) if d!=direction.reverse()]
+            if len(exits)!=1 or len(cells)>self.maze.area():
+                return None # inconsistent mapping
+            if exits[0]!=direction:
+                turns += 1
+            direction = exits[0]
+
+    def addEdge(self, edge):
+        key = (edge.source, edge.direction)
+        self.edges[key] = edge
+        for l in [edge.source] + edge.cells:
+            self.through.setdefault(l, set()).add(key)
+
+    def removeEdge(self, key):
+        edge = self.edges.pop(key, None)
+        if edge is None:
+            return
+        for l in [edge.source] + edge.cells:
+            keys = self.through.get(l)
+            if keys is not None:
+                keys.discard(key)
+                if len(keys)==0:
+                    del self.through[l]
+
+    # edges leaving a node
+    def neighbors(self, node):
+        for d in Direction:
+            edge = self.edges.get((node, d))
+            if edge is not None:
+                yield edge
+
+    def __str__(self):
+        keys = sorted(self.edges, key=lambda key: (key[0], key[1].value))
+        return '\n'.join(str(self.edges[key]) for key in keys)
@@ -1,3 +1,4 @@
+import hashlib
 import numpy as np
 
 class Maze(object):
@@ -56,6 +57,25 @@ class Maze(object):
             raise Exception('Consistency errors found in wall specifications!')
 
 
+    @classmethod
+    def fromWalls(cls, walls):
+        '''
+        Returns a maze over an existing walls array (e.g. a view of shared
+        memory). The array is neither copied nor validated again.
+        '''
+        maze = cls.__new__(cls)
+        maze.dim = walls.shape[0]
+        maze.walls = walls
+        return maze
+
+    def identity(self):
+        '''
+        Returns the SHA-1 (hex) of the walls, which identifies the maze
+        whether it was read from a file or given as an array.
+        '''
+        return hashlib.sha1(np.ascontiguousarray(self.walls, dtype=np.int8).tobytes()).hexdigest()
+
+
     def is_permissible(self, cell, direction):
         """
         Returns a boolean designating whether or not a cell is passable in the
@@ -0,0 +1,153 @@
+from maze import Maze
+from simulator import Simulator
+from util import Mapper, Goal, Direction, Heading, distanceField
+from graph import JunctionGraph
+from files import replaceFile
+import glob
+import hashlib
+import json
+import numpy as np
+import os
+
+"""
+Fewest time steps from the start to the goal with full knowledge of the maze
+- a breadth first search over the Simulator states (moves of up to 3 cells
+  after a rotation in one time step) - the best 2nd run a robot can do
+"""
+def oracleSteps(simulator):
+    dim = simulator.dim
+    states = dim * dim * 4
+    cell = np.arange(states) // 4
+    bounds = [dim/2 - 1, dim/2]
+    goal = np.in1d(cell // dim, bounds) & np.in1d(cell % dim, bounds)
+
+    steps = np.full(states, -1, dtype=np.int32)
+    frontier = np.array([simulator.state([0, 0], 'up')])
+    steps[frontier] = 0
+    step = 0
+    while len(frontier) > 0:
+        if goal[frontier].any():
+            return step
+        # moves stopped by a wall end where a shorter move does
+        moves = simulator.transition[frontier][~simulator.stopped[frontier]]
+        frontier = np.unique(moves)
+        frontier = frontier[steps[frontier] == -1]
+        step += 1
+        steps[frontier] = step
+    return None
+
+"""
+Index of the mazes in a directory
+- one entry per maze file with its size, hash, oracle 2nd run steps and score
+  (the best score a robot can get: the oracle steps in both runs plus the
+  reset step), shortest path length and junction graph statistics
+- kept in a JSON file in the directory and only recomputed for the files whose
+  modification time and size (and then content hash) changed
+- a file that is not a maze keeps an entry with no dim (and no statistics),
+  so it is not measured again until it changes
+"""
+class MazeIndex(object):
+    FILENAME = 'mazeindex.json'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.filename = os.path.join(directory, MazeIndex.FILENAME)
+        self.entries = {}
+        if os.path.exists(self.filename):
+            with open(self.filename) as f:
+                self.entries = json.load(f)
+
+    # bring the index up to date with the maze files (returns the names of
+    # the updated entries)
+    def update(self, pattern='*.txt'):
+        updated = []
+        names = set()
+        for path in sorted(glob.glob(os.path.join(self.directory, pattern))):
+            name = os.path.basename(path)
+            stat = os.stat(path)
+            names.add(name)
+            entry = self.entries.get(name)
+            if entry is not None and (entry['mtime'], entry['size']) == (stat.st_mtime, stat.st_size):
+                continue
+            sha1 = hashlib.sha1(open(path, 'rb').read()).hexdigest()
+            if entry is None or entry['sha1'] != sha1:
+                try:
+                    entry = MazeIndex.measure(path)
+                except Exception:
+                    entry = { 'dim': None } # not a maze file
+                entry['sha1'] = sha1
+            entry['mtime'], entry['size'] = stat.st_mtime, stat.st_size
+            self.entries[name] = entry
+            updated.append(name)
+        removed = [name for name in self.entries if name not in names]
+        for name in removed:
+            del self.entries[name]
+        if updated or removed:
+            self.save()
+        return updated
+
+    # write the index
+    def save(self):
+        with replaceFile(self.filename, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+
+    # the statistics of a maze file
+    @staticmethod
+    def measure(path):
+        import tester
+        maze = Maze(path)
+        steps = oracleSteps(Simulator(maze))
+        mapper = Mapper.openMazeFile(path)
+        rows, cols = mapper.shape
+        start = (rows-1, 0)
+        goal = Goal(rows, cols)
+        graph = JunctionGraph(mapper, goal, start)
+        exits = [sum(1 for d in Direction if mapper.canMove(Heading(d, (r, c))))
+                 for r in range(rows) for c in range(cols)]
+        corridors = [edge.length - 1 for edge in graph.edges.values()]
+        return {
+            'dim'             : maze.dim,
+            'oracle_steps'    : steps,
+            'oracle_score'    : tester.score([steps + 1, steps]) if steps is not None else None,
+            'shortest_path'   : int(distanceField(mapper, exact=True)[start]),
+            'nodes'           : len(graph.nodes),
+            'edges'           : len(graph.edges),
+            'junctions'       : sum(1 for n in exits if n >= 3),
+            'dead_ends'       : sum(1 for n in exits if n == 1),
+            'corridor_cells'  : sum(1 for n in exits if n == 2),
+            'mean_corridor'   : float(sum(corridors)) / len(corridors) if corridors else 0.0,
+        }
+
+    # the up to date entry of a maze file from the index in its directory
+    # (None when there is no index, the file is not a maze or it changed since
+    # it was indexed)
+    @staticmethod
+    def lookup(path):
+        index = MazeIndex(os.path.dirname(path) or '.')
+        entry = index.entries.get(os.path.basename(path))
+        if entry is None or entry['dim'] is None or not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        if (entry['mtime'], entry['size']) != (stat.st_mtime, stat.st_size):
+            return None
+        return entry
+
+if __name__ == '__main__':
+    '''
+    Builds or updates the index of the mazes in the given directories and
+    prints it.
+    '''
+    import sys
+    for directory in sys.argv[1:] or ['.']:
+        index = MazeIndex(directory)
+        updated = index.update()
+        print '-- {} ({} updated) --'.format(index.filename, len(updated))
+        print '{:<20} {:>4} {:>7} {:>8} {:>5} {:>6} {:>6} {:>10} {:>10}'.format(
+            'maze', 'dim', 'oracle', 'score', 'path', 'nodes', 'edges', 'junctions', 'dead ends')
+        for name in sorted(index.entries):
+            e = index.entries[name]
+            if e['dim'] is None:
+                continue
+            print '{:<20} {:>4} {:>7} {:>8.3f} {:>5} {:>6} {:>6} {:>10} {:>10}'.format(
+                name, e['dim'], e['oracle_steps'], e['oracle_score'], e['shortest_path'],
+                e['nodes'], e['edges'], e['junctions'], e['dead_ends'])
@@ -0,0 +1,201 @@
+from files import replaceFile
+import threading
+
+"""
+Run metrics
+- counters and histograms keyed by label values, kept in a Registry
+- exported in the Prometheus text exposition format or as JSON, and merged
+  from JSON so a runner can aggregate the metrics of many runs (or workers)
+- the JSON and HTTP modules are only imported when they are used, as every
+  script imports this module
+"""
+class Metric(object):
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {} # sorted (label, value) pairs => value
+
+    @staticmethod
+    def key(labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    @staticmethod
+    def format(key, extra=()):
+        pairs = list(key) + list(extra)
+        if len(pairs)==0:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+    def clear(self):
+        self.values = {}
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = Metric.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(Metric.key(labels), 0)
+
+    def lines(self):
+        for key in sorted(self.values):
+            yield '{}{} {}'.format(self.name, Metric.format(key), self.values[key])
+
+    def samples(self):
+        return [{'labels': dict(key), 'value': self.values[key]} for key in sorted(self.values)]
+
+    def add(self, sample, labels):
+        self.inc(sample['value'], **dict(sample['labels'], **labels))
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets):
+        Metric.__init__(self, name, help)
+        self.buckets = sorted(buckets)
+
+    # value => [count per bucket (the last one is +Inf), sum, count]
+    def observe(self, value, **labels):
+        key = Metric.key(labels)
+        if key not in self.values:
+            self.values[key] = [[0]*(len(self.buckets)+1), 0, 0]
+        entry = self.values[key]
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def lines(self):
+        for key in sorted(self.values):
+            counts, total, count = self.values[key]
+            cumulative = 0
+            for bound, n in zip(self.buckets + ['+Inf'], counts):
+                cumulative += n
+                yield '{}_bucket{} {}'.format(self.name, Metric.format(key, [('le', str(bound))]), cumulative)
+            yield '{}_sum{} {}'.format(self.name, Metric.format(key), total)
+            yield '{}_count{} {}'.format(self.name, Metric.format(key), count)
+
+    def samples(self):
+        return [{'labels': dict(key), 'counts': self.values[key][0],
+                 'sum': self.values[key][1], 'count': self.values[key][2]} for key in sorted(self.values)]
+
+    def add(self, sample, labels):
+        key = Metric.key(dict(sample['labels'], **labels))
+        if key not in self.values:
+            self.values[key] = [[0]*(len(self.buckets)+1), 0, 0]
+        counts, total, count = self.values[key]
+        self.values[key] = [[a+b for a, b in zip(counts, sample['counts'])],
+                            total + sample['sum'], count + sample['count']]
+
+"""
+The metrics of a process (or the aggregate of many)
+- the lock lets a server thread export while the runner merges
+"""
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def counter(self, name, help):
+        return self.register(Counter(name, help))
+
+    def histogram(self, name, help, buckets):
+        return self.register(Histogram(name, help, buckets))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def clear(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.clear()
+
+    # Prometheus text exposition format
+    def text(self):
+        out = []
+        with self.lock:
+            for metric in self.metrics:
+                out.append('# HELP {} {}'.format(metric.name, metric.help))
+                out.append('# TYPE {} {}'.format(metric.name, metric.kind))
+                out.extend(metric.lines())
+        return '\n'.join(out) + '\n'
+
+    # JSON-able dict (the input of merge)
+    def dump(self):
+        with self.lock:
+            result = {}
+            for metric in self.metrics:
+                result[metric.name] = {'type': metric.kind, 'help': metric.help, 'samples': metric.samples()}
+                if metric.kind=='histogram':
+                    result[metric.name]['buckets'] = metric.buckets
+            return result
+
+    def json(self):
+        import json
+        return json.dumps(self.dump(), indent=1, sort_keys=True)
+
+    # add the samples of a dump (with the extra labels) to the metrics
+    def merge(self, data, **labels):
+        with self.lock:
+            for metric in self.metrics:
+                for sample in data.get(metric.name, {}).get('samples', []):
+                    metric.add(sample, labels)
+
+    # write to a file (JSON for .json, the Prometheus text format otherwise)
+    def write(self, filename):
+        with replaceFile(filename, 'w') as f:
+            f.write(self.json() if filename.endswith('.json') else self.text())
+
+    # serve /metrics (Prometheus text format) and /metrics.json over HTTP from
+    # a daemon thread - returns the server (call shutdown() to stop it)
+    def serve(self, port, host=''):
+        import BaseHTTPServer
+        registry = self
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path=='/metrics':
+                    body, kind = registry.text(), 'text/plain; version=0.0.4'
+                elif self.path=='/metrics.json':
+                    body, kind = registry.json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', kind)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # no request log
+
+        server = BaseHTTPServer.HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+# the metrics recorded by this process
+registry = Registry()
+
+TRIALS        = registry.counter('mouse_trials_total', 'Trials by outcome (complete, timeout or error)')
+STEPS         = registry.counter('mouse_steps_total', 'Time steps by run')
+MOVES         = registry.counter('mouse_moves_total', 'Moves by run and kind (turn, straight or idle)')
+WALL_STOPS    = registry.counter('mouse_wall_stops_total', 'Moves stopped by a wall by run')
+REJECTED      = registry.counter('mouse_rejected_moves_total', 'Moves rejected by the robot against its sensors')
+HEURISTICS    = registry.counter('mouse_heuristic_builds_total', 'Heuristics built for the robot')
+RUN_STEPS     = registry.histogram('mouse_run_steps', 'Time steps of the completed runs',
+                                   [25, 50, 100, 200, 400, 800, 1000])
+SCORE         = registry.histogram('mouse_score', 'Scores of the completed trials',
+                                   [15, 20, 25, 30, 40, 50, 75, 100])
+COVERAGE      = registry.histogram('mouse_coverage_ratio', 'Mapped share of the maze at the end of the 1st run',
+                                   [0.25, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
+EXPANSIONS    = registry.histogram('mouse_planner_expansions', 'Node expansions per planner search',
+                                   [10, 30, 100, 300, 1000, 3000, 10000])
+OPEN_PEAK     = registry.histogram('mouse_planner_open_peak', 'Peak open list size per planner search',
+                                   [5, 10, 20, 50, 100, 200, 500, 1000])
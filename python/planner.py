@@ -1,16 +1,20 @@
 from util import *
+from graph import JunctionGraph
+import heapq
+import metrics
+import os
 import sys
+import time
 
 """
-A* search implementation returns the optimal moves
-in a list of (steering, movement) pairs
+A* search over the cells
+- returns (goal reached, last location, closed grid, action grid)
 """
-def findOptimalMoves(maze, goal, heuristic):
+def searchCells(maze, goal, heuristic, start):
     rows, cols = maze.shape
     closed = Grid(rows, cols, 0)
     action = Grid(rows, cols, '_')
 
-    start = (rows-1, 0) 
     closed.setValue(start, 1)
 
     g = 0
@@ -19,8 +23,11 @@ def findOptimalMoves(maze, goal, heuristic):
 
     goal_reached = False
     open = [(f,h,g,start,Direction.N)]
+    expansions = 0
+    peak = 1
     while len(open)>0:
         item = open.pop(0)
+        expansions += 1
 
         f = item[0]
         h = item[1]
@@ -44,39 +51,151 @@ def findOptimalMoves(maze, goal, heuristic):
                     action.setValue(l2, d2)
                     open.append((f2,h2,g2,l2,d2))
         open.sort()
+        peak = max(peak, len(open))
+
+    metrics.EXPANSIONS.observe(expansions, search='cells')
+    metrics.OPEN_PEAK.observe(peak, search='cells')
+    return goal_reached, l, closed, action
+
+"""
+A* search over the junction graph
+- the search state is (node, direction, run) as the cost of the next edge
+  depends on the direction the robot arrives in, and its number of moves on
+  the cells already in the last move (modulo 3)
+- paths of the same cost are ranked by their number of moves
+- the edges on the best path are written to the action grid cell by cell
+- returns (goal reached, last location, closed grid, action grid)
+"""
+def searchGraph(graph, goal, heuristic, start):
+    rows, cols = graph.maze.shape
+    closed = Grid(rows, cols, 0)
+    action = Grid(rows, cols, '_')
+
+    state = (start, Direction.N, 0)
+    cost = { state: (0, 0) }
+    parent = { state: None }
+    open = [(heuristic.getValue(start), 0, 0, start, Direction.N.value, 0)]
+    goal_reached = False
+    l = start
+    expansions = 0
+    peak = 1
+    while len(open)>0:
+        f, m, g, l, d, run = heapq.heappop(open)
+        state = (l, Direction(d), run)
+        if (g, m) > cost[state]:
+            continue
+        expansions += 1
+        closed.setValue(l, 1)
+        if goal.isGoal(l):
+            goal_reached = True
+            break
+        for edge in graph.neighbors(l):
+            g2 = g + edge.cost(state[1])
+            moves, run2 = edge.moves(state[1], run)
+            m2 = m + moves
+            state2 = (edge.target, edge.arrival, run2)
+            if (g2, m2) < cost.get(state2, (g2+1, m2)):
+                cost[state2] = (g2, m2)
+                parent[state2] = (state, edge)
+                f2 = g2 + heuristic.getValue(edge.target)
+                heapq.heappush(open, (f2, m2, g2, edge.target, edge.arrival.value, run2))
+        peak = max(peak, len(open))
+
+    metrics.EXPANSIONS.observe(expansions, search='graph')
+    metrics.OPEN_PEAK.observe(peak, search='graph')
+
+    # expand the edges on the best path into cells
+    if goal_reached:
+        while parent[state] is not None:
+            state, edge = parent[state]
+            for (location, direction), cell in zip(edge.steps(), edge.cells):
+                action.setValue(cell, direction)
+
+    return goal_reached, l, closed, action
+
+"""
+Trace the path from the last location back to the start using the action grid
+- returns the path grid (the direction to move at each cell of the path and
+  '*' at the last location) and the list of the path cells from the start
+"""
+def tracePath(action, start, l):
+    path = Grid(action.rows, action.cols, ' ')
+    path.setValue(l, '*')
+    cells = [l]
+    while l != start:
+        d = action.getValue(l)
+        if d == '_':
+            break
+        delta = d.delta()
+        l = (l[0] - delta[0], l[1] - delta[1])
+        path.setValue(l, d)
+        cells.append(l)
+    cells.reverse()
+    return path, cells
+
+"""
+Convert the path grid into moves from the heading until the goal
+allowing maximum 3 movement in one time step
+"""
+def pathMoves(path, heading, goal):
+    moves = []
+    # convert direction to steering
+    while not goal.isGoal(heading.location):
+        direction = path.getValue(heading.location)
+        steering = heading.direction.steer(direction)
+        movement = 1
+        while movement < 3:
+            next_heading = heading.adjust(steering, movement)
+            next_direction = path.getValue(next_heading.location)
+            if next_direction != direction:
+                break
+            movement += 1
+        moves.append((steering, movement))
+        heading = heading.adjust(steering, movement)
+    return moves
+
+"""
+A* search returns the optimal path cells from the start to the goal
+(empty if the goal can not be reached) without printing anything
+"""
+def findOptimalPath(maze, goal, heuristic, graph=None):
+    rows, cols = maze.shape
+    start = (rows-1, 0)
+    if graph is None:
+        goal_reached, l, closed, action = searchCells(maze, goal, heuristic, start)
+    else:
+        goal_reached, l, closed, action = searchGraph(graph, goal, heuristic, start)
+    if not goal_reached:
+        return []
+    return tracePath(action, start, l)[1]
+
+"""
+A* search implementation returns the optimal moves
+in a list of (steering, movement) pairs
+- the search runs over the cells or, when a junction graph is given,
+  over the graph nodes with the corridors expanded back into cells
+"""
+def findOptimalMoves(maze, goal, heuristic, graph=None):
+    rows, cols = maze.shape
+    start = (rows-1, 0) 
+
+    if graph is None:
+        goal_reached, l, closed, action = searchCells(maze, goal, heuristic, start)
+    else:
+        goal_reached, l, closed, action = searchGraph(graph, goal, heuristic, start)
 
     # find the optimal path and the optimal moves allowing maximum 3 movement in one time step
-    path_count = 0
     path = Grid(rows, cols, ' ')
+    cells = []
 
     move_count = 0
     moves = []
 
     if goal_reached:
-        path.setValue(l, '*')
-        while l != start:
-            d = action.getValue(l)
-            if d == '_':
-                break
-            delta = d.delta()
-            l = (l[0] - delta[0], l[1] - delta[1])                 
-            path.setValue(l, d)
-            path_count += 1
-        # convert direction to steering
-        heading = Heading(Direction.N, start)
-        while not goal.isGoal(heading.location):
-            direction = path.getValue(heading.location)
-            steering = heading.direction.steer(direction)
-            movement = 1
-            while movement < 3:
-                next_heading = heading.adjust(steering, movement)
-                next_direction = path.getValue(next_heading.location)
-                if next_direction != direction:
-                    break
-                movement += 1
-            moves.append((steering, movement))
-            heading = heading.adjust(steering, movement)
-            move_count += 1
+        path, cells = tracePath(action, start, l)
+        moves = pathMoves(path, Heading(Direction.N, start), goal)
+        move_count = len(moves)
+    path_count = max(len(cells)-1, 0)
 
     print '-- Maze --'
     print maze
@@ -96,10 +215,315 @@ def findOptimalMoves(maze, goal, heuristic):
 
     return moves
 
+"""
+Anytime A* planner (weighted A* tightened pass by pass, as in ARA*)
+- each pass searches with f = g + weight*h using the same costs as
+  findOptimalMoves (1 per cell, 2 when the direction changes)
+- plan() works within a time (seconds) and/or node expansion budget and can
+  be called again to resume where it stopped
+- the best plan so far is published with a bound (its cost is at most bound
+  times the optimal cost) when plan() finds a better one, even within a pass,
+  and after each finished pass
+- the heuristic is the breadth first distance to the goal on the map (unknown
+  cells open) which never overestimates the cost, so the bound holds
+"""
+class AnytimePlanner(object):
+    def __init__(self, maze, goal, start=None, weights=(3.0, 2.0, 1.5, 1.0)):
+        rows, cols = maze.shape
+        self.maze = maze
+        self.goal = goal
+        self.heuristic = distanceField(maze, exact=True)
+        self.start = (tuple(start) if start is not None else (rows-1, 0), Direction.N.value)
+        self.weights = list(weights)
+        self.weight = self.weights.pop(0)
+
+        self.g = { self.start: 0 }
+        self.parent = { self.start: None }
+        self.open = [(self.key(self.start), 0, self.start)]
+        self.closed = set()
+        self.incons = set()
+
+        self.best = None     # the goal state of the best plan
+        self.cost = float('inf')
+        self.path = None     # path grid of the published plan
+        self.moves = []      # moves of the published plan
+        self.published = float('inf') # cost of the published plan
+        self.bound = float('inf')
+        self.expansions = 0
+        self.peak = 1        # peak open list size
+        self.done = False
+
+    def h(self, state):
+        return max(self.heuristic[state[0]], 0)
+
+    def key(self, state):
+        return self.g[state] + self.weight*self.h(state)
+
+    # (next state, cost) pairs
+    def successors(self, state):
+        l, d = state
+        for d2 in Direction:
+            if self.maze.canMove(Heading(d2, l)):
+                delta = d2.delta()
+                l2 = (l[0] + delta[0], l[1] + delta[1])
+                if self.maze.isValid(l2) and not self.maze.isUnknown(l2):
+                    yield (l2, d2.value), (1 if d==d2.value else 2)
+
+    # spend the budget and return the best (moves, bound) found so far
+    def plan(self, seconds=None, expansions=None):
+        deadline = time.time() + seconds if seconds is not None else None
+        limit = self.expansions + expansions if expansions is not None else None
+        while not self.done:
+            finished = self.improve(deadline, limit)
+            if finished or self.cost < self.published:
+                self.publish(finished)
+            if not finished:
+                break # out of budget - resume on the next call
+            if len(self.weights)==0:
+                self.done = True
+                metrics.EXPANSIONS.observe(self.expansions, search='anytime')
+                metrics.OPEN_PEAK.observe(self.peak, search='anytime')
+                break
+            # tighten the weight and continue with the open and inconsistent states
+            self.weight = self.weights.pop(0)
+            states = self.incons.union(s for f, g, s in self.open if self.isValid(g, s))
+            self.open = [(self.key(s), self.g[s], s) for s in states]
+            heapq.heapify(self.open)
+            self.closed = set()
+            self.incons = set()
+        return self.moves, self.bound
+
+    # False for heap entries that were superseded or already expanded
+    def isValid(self, g, state):
+        return g==self.g[state] and state not in self.closed
+
+    # one weighted A* pass - returns False when the budget runs out first
+    def improve(self, deadline, limit):
+        while len(self.open)>0:
+            f, g, state = self.open[0]
+            if not self.isValid(g, state):
+                heapq.heappop(self.open)
+                continue
+            if self.cost <= f:
+                return True
+            if (limit is not None and self.expansions >= limit) or \
+               (deadline is not None and time.time() >= deadline):
+                return False
+            heapq.heappop(self.open)
+            self.closed.add(state)
+            self.expansions += 1
+            for state2, cost in self.successors(state):
+                g2 = g + cost
+                if g2 < self.g.get(state2, float('inf')):
+                    self.g[state2] = g2
+                    self.parent[state2] = state
+                    if self.goal.isGoal(state2[0]) and g2 < self.cost:
+                        self.cost = g2
+                        self.best = state2
+                    if state2 in self.closed:
+                        self.incons.add(state2)
+                    else:
+                        heapq.heappush(self.open, (self.key(state2), g2, state2))
+            self.peak = max(self.peak, len(self.open))
+        return True
+
+    # publish the best plan with its suboptimality bound (the weight only
+    # bounds it once the pass is finished)
+    def publish(self, finished=True):
+        if self.best is None:
+            return
+        self.published = self.cost
+        rows, cols = self.maze.shape
+        action = Grid(rows, cols, '_')
+        state = self.best
+        while self.parent[state] is not None:
+            action.setValue(state[0], Direction(state[1]))
+            state = self.parent[state]
+        self.path, cells = tracePath(action, self.start[0], self.best[0])
+        self.moves = pathMoves(self.path, Heading(Direction.N, self.start[0]), self.goal)
+        lower = [self.g[s] + self.h(s) for s in self.incons]
+        lower += [self.g[s] + self.h(s) for f, g, s in self.open if self.isValid(g, s)]
+        bound = float(self.cost) / min(lower) if lower else 1.0
+        self.bound = max(1.0, min(self.weight, bound) if finished else bound)
+        print 'Anytime plan! weight={} cost={} moves={} bound={:.2f} expansions={}'.format(
+            self.weight, self.cost, len(self.moves), self.bound, self.expansions)
+
+"""
+Plans the 2nd run in a background process while the robot explores
+- the robot submits the cells mapped since the last submission whenever the
+  worker is idle, so the worker only plans recent maps and the robot never
+  waits for it
+- the worker keeps its own map and junction graph up to date with the cells
+  it receives and runs the same search as findOptimalMoves (without printing
+  the grids) with the unmapped goal cells open, so that there is a plan
+  before the robot enters the goal - it sends back the map version, the
+  moves, their cost, the path steps (cell, direction) and the distances from
+  the start and to the goal over its map
+- at reset the latest finished plan is taken without waiting if its path is
+  still open through the cells mapped since (the others did not change) and
+  no path through those cells can be cheaper: such a path reaches the first
+  of them from a cell of the plan map and leaves the last one to a cell of
+  the plan map, so it is at least as long as the start distance of a
+  neighbor of the first, plus the Manhattan distance between the two, plus
+  the goal distance of a neighbor of the last (goal cells do not count as a
+  path ends at the first one) - otherwise the robot plans in line
+- the worker runs at a lower priority so that it does not slow the robot down
+"""
+class BackgroundPlanner(object):
+    def __init__(self, rows, cols, heuristic):
+        import multiprocessing
+        self.goal = Goal(rows, cols)
+        self.start = (rows-1, 0)
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=planInBackground, args=(child, rows, cols, heuristic.grid))
+        self.process.daemon = True
+        self.process.start()
+        self.submitted = 0  # the last submitted map version
+        self.busy = False
+        self.plan = None    # (version, moves, cost, steps, startDistance, goalDistance) of the latest plan
+
+    # collect the finished plan (if any) without waiting
+    def receive(self):
+        if self.busy and self.connection.poll():
+            self.plan = self.connection.recv()
+            self.busy = False
+
+    # submit the cells mapped since the last submission if the worker is idle
+    # (never waits)
+    def submit(self, maze):
+        self.receive()
+        if not self.busy and maze.version() != self.submitted:
+            cells = [(l, maze.getValue(l)) for l in set(maze.changes[self.submitted:])]
+            self.submitted = maze.version()
+            self.connection.send((self.submitted, cells))
+            self.busy = True
+
+    # True if the plan path is open and no path through the cells mapped after
+    # the plan map can be cheaper
+    def isCurrent(self, plan, maze):
+        version, moves, cost, steps, startDistance, goalDistance = plan
+        if len(moves)==0:
+            return False
+        changes = set(maze.changes[version:])
+        for l, direction in steps:
+            if l in changes and not maze.canMove(Heading(direction, l)):
+                return False
+        changes = set(l for l in changes if not self.goal.isGoal(l))
+        sides = dict((l, self.sides(maze, startDistance, goalDistance, l)) for l in changes)
+        for l in changes:
+            enter = min([s for d, s, g in sides[l]] or [float('inf')])
+            for l2 in changes:
+                if l==l2:
+                    # in and out of the cell by different sides
+                    bound = min([s + g for d, s, g0 in sides[l] for d2, s0, g in sides[l] if d!=d2] or [float('inf')])
+                else:
+                    leave = min([g for d, s, g in sides[l2]] or [float('inf')])
+                    bound = enter + abs(l[0]-l2[0]) + abs(l[1]-l2[1]) + leave
+                if bound < cost:
+                    return False
+        return True
+
+    # (side, start distance, goal distance) through each open side of a cell
+    # by the distances of the neighbors (infinite if not reached) - the start
+    # is entered from nowhere
+    def sides(self, maze, startDistance, goalDistance, location):
+        inf = float('inf')
+        result = []
+        for d in Direction:
+            l = tuple(Heading(d, location).forward().location)
+            if maze.canMove(Heading(d, location)) and maze.isValid(l):
+                result.append((d, startDistance[l]+1 if startDistance[l]>=0 else inf,
+                                  goalDistance[l]+1 if goalDistance[l]>=0 else inf))
+        if location==self.start:
+            result.append((None, 0, inf))
+        return result
+
+    # the moves of the latest plan if it is current, otherwise None - the
+    # worker is stopped either way
+    def take(self, maze):
+        self.receive()
+        plan = self.plan
+        self.stop()
+        if plan is None or not self.isCurrent(plan, maze):
+            print 'Background plan stale! map version {} of {}'.format(plan[0] if plan else '-', maze.version())
+            return None
+        version, moves = plan[:2]
+        print 'Background plan! map version {} of {}'.format(version, maze.version())
+        print '-- Moves --'
+        for steering, movement in moves:
+            print '({},{})'.format(steering, movement)
+        print '# of Moves! {}'.format(len(moves))
+        return moves
+
+    # the worker is not waited for (a search in progress is cut short)
+    def stop(self):
+        if self.busy:
+            self.process.terminate()
+        else:
+            self.connection.send(None)
+
+# the background worker: updates its map with the cells received and plans
+# until None is received
+def planInBackground(connection, rows, cols, values):
+    # below the robot so that the exploration steps come first
+    if hasattr(os, 'nice'):
+        os.nice(10)
+    goal = Goal(rows, cols)
+    start = (rows-1, 0)
+    maze = Mapper(rows, cols)
+    for r in range(rows):
+        for c in range(cols):
+            if goal.isGoal((r, c)):
+                maze.setValue((r, c), 15) # open until mapped
+    heuristic = Grid(rows, cols, -1)
+    heuristic.grid = values
+    graph = JunctionGraph(maze, goal, start)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        version, mapped = message
+        for l, value in mapped:
+            maze.setValue(l, value)
+            graph.update(l)
+        goal_reached, l, closed, action = searchGraph(graph, goal, heuristic, start)
+        moves = []
+        steps = []
+        if goal_reached:
+            path, cells = tracePath(action, start, l)
+            moves = pathMoves(path, Heading(Direction.N, start), goal)
+            steps = [(cell, path.getValue(cell)) for cell in cells[:-1]]
+        # the same cost as the search: 1 per cell plus 1 per direction change
+        cost = sum(abs(movement) + (0 if steering==Steering.F else 1) for steering, movement in moves)
+        startDistance = distanceField(maze, [start], openUnknown=False, exact=True)
+        goalDistance = distanceField(maze, openUnknown=False, exact=True)
+        connection.send((version, moves, cost, steps, startDistance, goalDistance))
+
 if __name__ == '__main__':
+    from snapshot import Snapshot
     filename = sys.argv[1]
-    maze = Mapper.openMazeFile(filename)
+    # the map can also be a robot snapshot
+    if Snapshot.isSnapshot(filename):
+        maze = Snapshot(filename).mapper()
+    else:
+        maze = Mapper.openMazeFile(filename)
     rows, cols = maze.shape
     goal = Goal(rows, cols)
     heuristic = Heuristic(maze)
-    findOptimalMoves(maze, goal, heuristic)
+    # search the junction graph when 'graph' is given after the file name
+    # or plan anytime with a node expansion budget per call after 'anytime'
+    if len(sys.argv)>2 and sys.argv[2]=='anytime':
+        budget = int(sys.argv[3]) if len(sys.argv)>3 else 20
+        planner = AnytimePlanner(maze, goal)
+        while not planner.done:
+            planner.plan(expansions=budget)
+        print '-- Path --'
+        print planner.path
+        print '# of Moves! {}'.format(len(planner.moves))
+    elif len(sys.argv)>2 and sys.argv[2]=='graph':
+        graph = JunctionGraph(maze, goal, (rows-1, 0))
+        print '-- Graph --'
+        print '{} nodes {} edges for {} cells'.format(len(graph.nodes), len(graph.edges), maze.area())
+        findOptimalMoves(maze, goal, heuristic, graph)
+    else:
+        findOptimalMoves(maze, goal, heuristic)
@@ -0,0 +1,266 @@
+from util import *
+import struct
+import zlib
+
+# colors (RGB)
+WHITE   = (255, 255, 255)
+BLACK   = (  0,   0,   0)
+GRAY    = (200, 200, 200)
+RED     = (220,  40,  40)
+BLUE    = ( 40,  80, 220)
+GREEN   = ( 30, 160,  60)
+ORANGE  = (240, 140,  20)
+
+"""
+Headless maze renderer
+- the image is built from the wall bits (Mapper layout: row 0 is the top row,
+  -1 for unknown cells) with numpy array operations
+- overlays: Counter heat map, DeadEnds marks, Heuristic values, planned path
+- writes PNG (no imaging library needed) or SVG
+"""
+class Renderer(object):
+    def __init__(self, walls, cell=20):
+        self.walls = np.asarray(walls)
+        self.rows, self.cols = self.walls.shape
+        self.cell = cell
+        self.fill = np.empty((self.rows, self.cols, 3), dtype=np.uint8)
+        self.fill[:] = WHITE
+        self.fill[self.walls==-1] = GRAY
+        self.labels = None
+        self.marks = []
+        self.path = []
+
+    # renderer for a maze.Maze (walls[x, y] with y going up)
+    @staticmethod
+    def fromMaze(maze, cell=20):
+        return Renderer(maze.walls.T[::-1], cell)
+
+    # renderer for a Mapper (or any Grid of wall bits)
+    @staticmethod
+    def fromMapper(mapper, cell=20):
+        return Renderer(mapper.array(), cell)
+
+    # color the cells by value (e.g. Counter) from white to the color
+    def heatmap(self, values, color=RED):
+        values = np.asarray(values, dtype=float)
+        scale = values.max() if values.max() > 0 else 1.0
+        alpha = np.clip(values/scale, 0, 1)[:, :, None]
+        heat = (1-alpha)*np.array(WHITE) + alpha*np.array(color)
+        known = (values > 0)
+        self.fill[known] = heat[known].astype(np.uint8)
+
+    # color by the heuristic values (far is dark) and keep the values as labels for SVG
+    def heuristic(self, values, color=BLUE):
+        values = np.asarray(values)
+        self.heatmap(np.where(values>=0, values.max()-values+1, 0), color)
+        self.labels = values
+
+    # mark the dead end sides of the cells (given as DeadEnds.mask() bits)
+    def deadEnds(self, mask):
+        mask = np.asarray(mask)
+        for d in Direction:
+            for r, c in zip(*np.nonzero((mask >> d.value) & 1)):
+                self.marks.append(((r, c), d))
+
+    # planned path as a list of cells from the start
+    def plan(self, cells):
+        self.path = [tuple(l) for l in cells]
+
+    # pixels of the maze with the overlays as a (height, width, 3) uint8 array
+    def pixels(self):
+        s = self.cell
+        rows, cols = self.rows, self.cols
+        image = np.empty((rows*s+1, cols*s+1, 3), dtype=np.uint8)
+        image[:] = WHITE
+        image[:rows*s, :cols*s] = np.repeat(np.repeat(self.fill, s, axis=0), s, axis=1)
+
+        # dead end marks: a bar along the side of the cell
+        if self.marks:
+            r = np.array([m[0][0] for m in self.marks])
+            c = np.array([m[0][1] for m in self.marks])
+            d = np.array([m[1].value for m in self.marks])
+            w = max(s/5, 1)
+            for value in range(4):
+                k = d==value
+                top = r[k]*s + (s-w if value==2 else 0)
+                left = c[k]*s + (s-w if value==1 else 0)
+                height = w if value in (0, 2) else s
+                width = s if value in (0, 2) else w
+                ys = (top[:, None] + np.arange(height))[:, :, None]
+                xs = (left[:, None] + np.arange(width))[:, None, :]
+                image[ys, xs] = ORANGE
+
+        # planned path: a line through the cell centers
+        if self.path:
+            w = max(s/6, 1)
+            for a, b in zip(self.path, self.path[1:] + self.path[-1:]):
+                top, bottom = sorted([a[0], b[0]])
+                left, right = sorted([a[1], b[1]])
+                image[top*s+s/2-w/2 : bottom*s+s/2-w/2+w, left*s+s/2-w/2 : right*s+s/2-w/2+w] = GREEN
+
+        # walls
+        north, west = self.lines()
+        r, c = np.nonzero(north)
+        image[(r*s)[:, None], c[:, None]*s + np.arange(s+1)] = BLACK
+        r, c = np.nonzero(west)
+        image[r[:, None]*s + np.arange(s+1), (c*s)[:, None]] = BLACK
+        return image
+
+    # wall lines: north[r, c] is the line above cell (r, c) (r==rows is the
+    # bottom edge) and west[r, c] the line to its left (c==cols is the right edge)
+    # - a line is drawn when either side of it is closed
+    def lines(self):
+        known = self.walls!=-1
+        rows, cols = self.rows, self.cols
+        closed = [known & ((self.walls & 2**d.value)==0) for d in Direction]
+        north = np.zeros((rows+1, cols), dtype=bool)
+        north[:rows] |= closed[Direction.N.value]
+        north[1:] |= closed[Direction.S.value]
+        west = np.zeros((rows, cols+1), dtype=bool)
+        west[:, :cols] |= closed[Direction.W.value]
+        west[:, 1:] |= closed[Direction.E.value]
+        return north, west
+
+    # draw the robot into pixels (a square with a bar on its heading side)
+    def drawRobot(self, image, location, direction):
+        s = self.cell
+        r, c = location
+        m = max(s/4, 1)
+        image[r*s+m : (r+1)*s-m+1, c*s+m : (c+1)*s-m+1] = BLUE
+        delta = direction.delta()
+        cr, cc = r*s+s/2, c*s+s/2
+        for i in range(m, s/2):
+            image[cr+delta[0]*i-m/2 : cr+delta[0]*i+m/2+1, cc+delta[1]*i-m/2 : cc+delta[1]*i+m/2+1] = BLACK
+
+    def png(self, filename, image=None):
+        writePNG(filename, self.pixels() if image is None else image)
+
+    def svg(self, filename):
+        s = self.cell
+        height, width = self.rows*s+1, self.cols*s+1
+        out = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">'.format(width, height)]
+        out.append('<rect width="{}" height="{}" fill="white"/>'.format(width, height))
+        for r in range(self.rows):
+            for c in range(self.cols):
+                color = tuple(self.fill[r, c].tolist())
+                if color != WHITE:
+                    out.append('<rect x="{}" y="{}" width="{}" height="{}" fill="rgb{}"/>'.format(
+                        c*s, r*s, s, s, color))
+        for (r, c), d in self.marks:
+            w = max(s/5, 1)
+            x = c*s + (s-w if d==Direction.E else 0)
+            y = r*s + (s-w if d==Direction.S else 0)
+            wide = d in (Direction.N, Direction.S)
+            out.append('<rect x="{}" y="{}" width="{}" height="{}" fill="rgb{}"/>'.format(
+                x, y, s if wide else w, w if wide else s, ORANGE))
+        if self.labels is not None:
+            for r in range(self.rows):
+                for c in range(self.cols):
+                    out.append('<text x="{}" y="{}" font-size="{}" text-anchor="middle">{}</text>'.format(
+                        c*s+s/2, r*s+s*2/3, s/2, self.labels[r][c]))
+        if self.path:
+            points = ' '.join('{},{}'.format(c*s+s/2, r*s+s/2) for r, c in self.path)
+            out.append('<polyline points="{}" fill="none" stroke="rgb{}" stroke-width="{}"/>'.format(
+                points, GREEN, max(s/6, 1)))
+        north, west = self.lines()
+        for r, c in zip(*np.nonzero(north)):
+            out.append('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="black"/>'.format(c*s, r*s, (c+1)*s, r*s))
+        for r, c in zip(*np.nonzero(west)):
+            out.append('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="black"/>'.format(c*s, r*s, c*s, (r+1)*s))
+        out.append('</svg>')
+        with open(filename, 'w') as f:
+            f.write('\n'.join(out))
+
+    # one PNG per recorded pose - the maze and overlays are rendered once
+    # and only the robot is drawn on a copy for each frame
+    def frames(self, poses, pattern):
+        base = self.pixels()
+        for i, (location, direction) in enumerate(poses):
+            image = base.copy()
+            self.drawRobot(image, location, direction)
+            writePNG(pattern.format(i), image, level=1)
+
+"""
+Write a (height, width, 3) uint8 array as an RGB PNG file
+"""
+def writePNG(filename, image, level=6):
+    height, width, _ = image.shape
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width*3)])
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    with open(filename, 'wb') as f:
+        f.write('\x89PNG\r\n\x1a\n')
+        f.write(chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk('IDAT', zlib.compress(raw.tobytes(), level)))
+        f.write(chunk('IEND', ''))
+
+"""
+Read the poses recorded by the tester (RECORD env var) for one run
+- each line is: run x y heading (tester coordinates)
+- returns [(location, direction)] in the Mapper layout
+"""
+def readRecord(filename, dim, run=None):
+    directions = {'up': Direction.N, 'right': Direction.E, 'down': Direction.S, 'left': Direction.W}
+    poses = []
+    with open(filename) as f:
+        for line in f:
+            r, x, y, heading = line.split()
+            if run is None or int(r)==run:
+                poses.append(((dim-1-int(y), int(x)), directions[heading]))
+    return poses
+
+if __name__ == '__main__':
+    '''
+    Renders a maze (and optionally what a robot learned about it) to a PNG or
+    SVG file, or the poses recorded by the tester to one PNG per time step.
+    '''
+    import argparse
+    from maze import Maze
+    from planner import findOptimalPath
+    from snapshot import Snapshot
+
+    parser = argparse.ArgumentParser(description='headless maze renderer')
+    parser.add_argument('maze', help='maze file')
+    parser.add_argument('output', help='.png or .svg file (or a frame file pattern like frame{:04d}.png with --record)')
+    parser.add_argument('--cell', type=int, default=20, help='cell size in pixels')
+    parser.add_argument('--snapshot', help='robot snapshot for the overlays')
+    parser.add_argument('--mapped', action='store_true', help='draw the walls mapped in the snapshot')
+    parser.add_argument('--counter', action='store_true', help='Counter heat map')
+    parser.add_argument('--deadends', action='store_true', help='DeadEnds marks')
+    parser.add_argument('--heuristic', action='store_true', help='Heuristic values')
+    parser.add_argument('--path', action='store_true', help='planned path')
+    parser.add_argument('--record', help='poses recorded by the tester (RECORD env var)')
+    parser.add_argument('--run', type=int, default=None, help='only the frames of this run')
+    args = parser.parse_args()
+
+    maze = Maze(args.maze)
+    snapshot = Snapshot(args.snapshot) if args.snapshot else None
+    if snapshot is not None and args.mapped:
+        renderer = Renderer(snapshot.maze, args.cell)
+    else:
+        renderer = Renderer.fromMaze(maze, args.cell)
+
+    if snapshot is not None:
+        if args.counter:
+            renderer.heatmap(snapshot.counter)
+        if args.heuristic:
+            renderer.heuristic(snapshot.heuristic)
+        if args.deadends:
+            renderer.deadEnds(snapshot.deadEnds)
+    if args.path:
+        # plan on the snapshot map if given, otherwise on the maze itself
+        if snapshot is not None:
+            mapper = snapshot.mapper()
+            heuristic = Grid(mapper.rows, mapper.cols, -1)
+            heuristic.grid = snapshot.heuristic.tolist()
+        else:
+            mapper = Mapper.openMazeFile(args.maze)
+            heuristic = Heuristic(mapper)
+        renderer.plan(findOptimalPath(mapper, Goal(mapper.rows, mapper.cols), heuristic))
+
+    if args.record:
+        renderer.frames(readRecord(args.record, maze.dim, args.run), args.output)
+    elif args.output.endswith('.svg'):
+        renderer.svg(args.output)
+    else:
+        renderer.png(args.output)
@@ -0,0 +1,111 @@
+from files import replaceFile
+import mmap
+import os
+import struct
+
+"""
+Ring buffer of robot updates in a memory mapped file (e.g. in /dev/shm)
+- a fixed header (magic, version, slots, dim, the last sequence number), the
+  maze walls (int8, tester layout) and a fixed number of record slots
+- the writer (the tester) never waits for or even knows about readers: each
+  update overwrites the oldest slot and bumps the sequence number
+- readers map the same file and take the records they want at their own pace;
+  a slot is marked invalid (sequence 0) while it is written, so a record is
+  only used if its sequence number is the expected one before and after it is
+  read (otherwise the writer lapped the reader and it was overwritten)
+"""
+class RingBuffer(object):
+    MAGIC = 'MOUSERNG'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIII')
+    SEQUENCE = struct.Struct('<Q')
+    SEQUENCE_OFFSET = 24
+    HEADER_SIZE = 64
+    # sequence, run, time, x, y, heading, left, front, right, rotation, movement, stopped
+    RECORD = struct.Struct('<Q11i')
+    RECORD_SIZE = 64
+    FIELDS = ['sequence', 'run', 'time', 'x', 'y', 'heading',
+              'left', 'front', 'right', 'rotation', 'movement', 'stopped']
+
+    def __init__(self, filename, writable=False):
+        self.filename = filename
+        self.file = open(filename, 'r+b' if writable else 'rb')
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.memory = mmap.mmap(self.file.fileno(), 0, access=access)
+        magic, version, self.slots, self.dim = RingBuffer.HEADER.unpack_from(self.memory, 0)
+        if magic != RingBuffer.MAGIC:
+            raise Exception('Not a ring buffer: {}'.format(filename))
+        if version != RingBuffer.VERSION:
+            raise Exception('Unsupported ring buffer version {} (expected {})'.format(version, RingBuffer.VERSION))
+        self.records = RingBuffer.layout(self.dim)
+        self.sequence = self.last()
+
+    # offset of the first record slot (after the walls, 64 byte aligned)
+    @staticmethod
+    def layout(dim):
+        return RingBuffer.HEADER_SIZE + (dim*dim + 63) // 64 * 64
+
+    # create a new ring buffer for a maze and open it for writing (readers of the
+    # old file can tell it was replaced)
+    @staticmethod
+    def create(filename, walls, slots=1024):
+        dim = walls.shape[0]
+        records = RingBuffer.layout(dim)
+        with replaceFile(filename) as f:
+            f.write(RingBuffer.HEADER.pack(RingBuffer.MAGIC, RingBuffer.VERSION, slots, dim).ljust(RingBuffer.HEADER_SIZE, '\0'))
+            f.write(''.join(chr(v) for v in walls.ravel()).ljust(records - RingBuffer.HEADER_SIZE, '\0'))
+            f.write('\0' * (slots * RingBuffer.RECORD_SIZE))
+        return RingBuffer(filename, writable=True)
+
+    # walls as rows of wall bits (walls[x][y] with y going up as in the tester)
+    def walls(self):
+        values = [ord(c) for c in self.memory[RingBuffer.HEADER_SIZE:RingBuffer.HEADER_SIZE + self.dim*self.dim]]
+        return [values[x*self.dim:(x+1)*self.dim] for x in range(self.dim)]
+
+    def offset(self, sequence):
+        return self.records + (sequence % self.slots) * RingBuffer.RECORD_SIZE
+
+    # writer: publish one update (run, time, x, y, heading, left, front, right,
+    # rotation, movement, stopped) - this never blocks
+    def publish(self, *values):
+        sequence = self.sequence + 1
+        offset = self.offset(sequence)
+        RingBuffer.SEQUENCE.pack_into(self.memory, offset, 0)
+        RingBuffer.RECORD.pack_into(self.memory, offset, 0, *values)
+        RingBuffer.SEQUENCE.pack_into(self.memory, offset, sequence)
+        RingBuffer.SEQUENCE.pack_into(self.memory, RingBuffer.SEQUENCE_OFFSET, sequence)
+        self.sequence = sequence
+
+    # reader: the sequence number of the last published update
+    def last(self):
+        return RingBuffer.SEQUENCE.unpack_from(self.memory, RingBuffer.SEQUENCE_OFFSET)[0]
+
+    # reader: the update with a sequence number as a dict (None if it was overwritten)
+    def read(self, sequence):
+        offset = self.offset(sequence)
+        values = RingBuffer.RECORD.unpack_from(self.memory, offset)
+        if values[0] != sequence or RingBuffer.SEQUENCE.unpack_from(self.memory, offset)[0] != sequence:
+            return None
+        return dict(zip(RingBuffer.FIELDS, values))
+
+    # reader: the updates published after a sequence number (at most a ring full)
+    def since(self, sequence):
+        last = self.last()
+        result = []
+        for s in range(max(sequence + 1, last - self.slots + 1, 1), last + 1):
+            record = self.read(s)
+            if record is not None:
+                result.append(record)
+        return result
+
+    # reader: True when the file was replaced by a new ring buffer (a new run)
+    def replaced(self):
+        try:
+            return os.stat(self.filename).st_ino != self.inode
+        except OSError:
+            return False
+
+    def close(self):
+        self.memory.close()
+        self.file.close()
@@ -1,9 +1,11 @@
 import os
 import time
 from controller import *
+from graph import JunctionGraph
+import metrics
 
 class Robot(object):
-    def __init__(self, maze_dim):
+    def __init__(self, maze_dim, controller_name=None, snapshot=None, identity=None):
         '''
         Use the initialization function to set up attributes that your robot
         will use to learn and navigate the maze. Some initial attributes are
@@ -18,29 +20,38 @@ class Robot(object):
         # these objects can be access by the controller via robot object
         # which is passed via the search method of the controller
         self.goal = Goal(rows, cols)
-        self.maze = Mapper(rows, cols)
-        self.counter = Counter(rows, cols)
-        self.deadEnds = DeadEnds(rows, cols)
-        self.deadEnds.setDeadEnd(self.heading.reverse())
-        self.heuristic = Heuristic(self.maze)
+        self.forget(rows, cols)
 
         # controller creation based on the env var which has the name of the controller
-        try:
-            controller_name = os.environ['CONTROL']
-        except:
-            controller_name = ''
-        if controller_name=='random':
-            self.controller = Controller_Random()
-        elif controller_name=='deadend':
-            self.controller = Controller_DeadEnd()
-        elif controller_name=='deadend2':
-            self.controller = Controller_DeadEnd2()
-        elif controller_name=='counter':
-            self.controller = Controller_Counter()
-        elif controller_name=='heuristic':
-            self.controller = Controller_Heuristic()
-        else:
-            self.controller = Controller() # this does nothing
+        # unless the name is given explicitly
+        if controller_name is None:
+            controller_name = os.environ.get('CONTROL', '')
+        self.controller = createController(controller_name)
+
+        # learned knowledge is restored from a snapshot file (if it exists) and
+        # saved to it at the end of the 1st run - the file name is given in an
+        # env var 'SNAPSHOT' unless it is given explicitly
+        # - the identity of the maze (Maze.identity) is saved with it, and a
+        # snapshot of another maze is not used
+        if snapshot is None:
+            snapshot = os.environ.get('SNAPSHOT')
+        self.snapshot = snapshot
+        self.identity = identity
+        if self.snapshot and os.path.exists(self.snapshot):
+            from snapshot import Snapshot
+            self.warmStart(Snapshot(self.snapshot))
+
+        # the 2nd run can be planned in a background process while exploring
+        # if an env var 'PLAN_BACKGROUND' is set (not with the anytime planner,
+        # nor in daemonic processes such as the tournament workers as they can
+        # not have children)
+        self.background = None
+        if os.environ.get('PLAN_BACKGROUND') and not os.environ.get('PLAN_BUDGET') and \
+           self.controller.__class__ is not Controller_WarmStart:
+            import multiprocessing
+            if not multiprocessing.current_process().daemon:
+                from planner import BackgroundPlanner
+                self.background = BackgroundPlanner(rows, cols, self.heuristic)
 
         # tick delay can be specified in an env var 'DELAY'
         self.time = 0
@@ -49,6 +60,49 @@ class Robot(object):
         except:
             self.tick_delay = 0
 
+    # fresh knowledge of the maze
+    def forget(self, rows, cols):
+        self.maze = Mapper(rows, cols)
+        self.counter = Counter(rows, cols)
+        self.deadEnds = DeadEnds(rows, cols)
+        self.deadEnds.setDeadEnd(Heading(Direction.N, self.start).reverse())
+        self.heuristic = Heuristic(self.maze)
+        self.graph = JunctionGraph(self.maze, self.goal, self.start)
+
+    # continue from the knowledge in a snapshot - the 1st run follows the
+    # optimal moves on the restored map when it reaches the goal (the
+    # exploration controller takes over if the sensors reject a move)
+    def warmStart(self, snapshot):
+        if snapshot.identity != self.identity:
+            print 'Snapshot is for another maze! {}'.format(self.snapshot)
+            return
+        snapshot.restore(self)
+        self.graph = JunctionGraph(self.maze, self.goal, self.start)
+        controller = Controller_WarmStart(self)
+        if len(controller.moves)>0:
+            self.explorer = self.controller
+            self.controller = controller
+            self.trail = [] # (heading, sensor, steering, movement) of each step
+
+    # the restored knowledge does not match the maze - explore from here with
+    # fresh knowledge of what was sensed and passed through in this run
+    def explore(self):
+        print 'Snapshot does not match the maze! exploring'
+        self.forget(*self.maze.shape)
+        for heading, sensor, steering, movement in self.trail:
+            self.maze.expand(heading, sensor)
+            self.deadEnds.update(heading, sensor, self.maze)
+            self.counter.increment(heading.location)
+            # the cells moved through are open along the way
+            direction = heading.direction.adjust(steering)
+            passage = 2**direction.value + 2**direction.reverse().value
+            for k in range(1, movement):
+                location = heading.adjust(steering, k).location
+                if self.maze.getValue(location) == -1:
+                    self.maze.setValue(location, passage)
+        self.graph = JunctionGraph(self.maze, self.goal, self.start)
+        self.controller = self.explorer
+
     def reset(self):
         self.heading = Heading(Direction.N, self.start)
         self.prev_heading = None
@@ -84,23 +138,39 @@ class Robot(object):
         # update utilities with the current location and sensor
         heading = self.heading
         self.sensor = Sensor(sensors)
+        value = self.maze.getValue(heading.location)
         self.maze.expand(heading, self.sensor)
+        if self.maze.getValue(heading.location) != value:
+            self.graph.update(heading.location)
         self.deadEnds.update(heading, self.sensor, self.maze)
         self.counter.increment(heading.location)
 
         # check if the controller wants to reset or not
         if self.controller.canReset(self):
             self.report()
+            metrics.COVERAGE.observe(self.counter.coverage()[0]/100.0)
+            if self.snapshot:
+                from snapshot import Snapshot
+                Snapshot.save(self.snapshot, self)
             self.reset()
-            # switch to the 2nd run controller
-            self.controller = Controller_Exploitation(self)
+            # switch to the 2nd run controller (with the background plan if it is current)
+            moves = None
+            if self.background is not None:
+                moves = self.background.take(self.maze)
+                self.background = None
+            self.controller = Controller_Exploitation(self, moves)
             return ('Reset', 'Reset')
 
+        # the map of each exploration step goes to the background planner
+        if self.background is not None:
+            self.background.submit(self.maze)
+
         # ask the controller for the next move (passing self as a context)
         steering, movement = self.controller.search(self)
 
         # check the steering and movement against sensor values
-        if self.sensor.distance(steering)>=movement:
+        rejected = self.sensor.distance(steering)<movement
+        if not rejected:
             # update our direction and location
             self.prev_heading = heading
             self.heading = heading.adjust(steering, movement)
@@ -115,6 +185,14 @@ class Robot(object):
             # wrong move - do not apply
             rotation = 0
             movement = 0
+            metrics.REJECTED.inc()
+
+        # a warm start explores when its moves are rejected or run out before
+        # the goal
+        if self.controller.__class__ is Controller_WarmStart:
+            self.trail.append((heading, self.sensor, steering, movement))
+            if rejected or (len(self.controller.moves)==0 and not self.goal.isGoal(self.heading.location)):
+                self.explore()
 
         print '{:03d} {} {} [{:>2d},{:>2d},{:>2d}] {:>3d},{:>2d} => {} {}'.format(
             self.time, 
@@ -1,58 +1,27 @@
 from maze import Maze
-import turtle
+from render import Renderer
+import os
 import sys
 
 if __name__ == '__main__':
     '''
-    This function uses Python's turtle library to draw a picture of the maze
-    given as an argument when running the script.
+    This function draws a picture of the maze given as an argument when
+    running the script into an image file (PNG or SVG by the file extension,
+    the maze file name with .png in the current directory by default). It
+    needs no display.
     '''
 
     # Create a maze based on input argument on command line.
     testmaze = Maze( str(sys.argv[1]) )
-
-    # Intialize the window and drawing turtle.
-    window = turtle.Screen()
-    wally = turtle.Turtle()
-    wally.speed(0)
-    wally.hideturtle()
-    wally.penup()
-
-    # maze centered on (0,0), squares are 20 units in length.
-    sq_size = 20
-    origin = testmaze.dim * sq_size / -2
-
-    # iterate through squares one by one to decide where to draw walls
-    for x in range(testmaze.dim):
-        for y in range(testmaze.dim):
-            if not testmaze.is_permissible([x,y], 'up'):
-                wally.goto(origin + sq_size * x, origin + sq_size * (y+1))
-                wally.setheading(0)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-            if not testmaze.is_permissible([x,y], 'right'):
-                wally.goto(origin + sq_size * (x+1), origin + sq_size * y)
-                wally.setheading(90)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-            # only check bottom wall if on lowest row
-            if y == 0 and not testmaze.is_permissible([x,y], 'down'):
-                wally.goto(origin + sq_size * x, origin)
-                wally.setheading(0)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-            # only check left wall if on leftmost column
-            if x == 0 and not testmaze.is_permissible([x,y], 'left'):
-                wally.goto(origin, origin + sq_size * y)
-                wally.setheading(90)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-    window.exitonclick()
\ No newline at end of file
+    if len(sys.argv) > 2:
+        filename = sys.argv[2]
+    else:
+        filename = os.path.splitext(os.path.basename(sys.argv[1]))[0] + '.png'
+
+    # maze squares are 20 pixels in length.
+    renderer = Renderer.fromMaze(testmaze, 20)
+    if filename.endswith('.svg'):
+        renderer.svg(filename)
+    else:
+        renderer.png(filename)
+    print 'Maze drawn to {}'.format(filename)
@@ -0,0 +1,108 @@
+import numpy as np
+
+# heading index order matches the wall bits: 2**index is the open bit
+headings = ['up', 'right', 'down', 'left']
+heading_index = {'u': 0, 'r': 1, 'd': 2, 'l': 3,
+                 'up': 0, 'right': 1, 'down': 2, 'left': 3}
+heading_move = [[0, 1], [1, 0], [0, -1], [-1, 0]]
+
+# rotations in the order of the transition table (counterclockwise, none, clockwise)
+rotations = [-90, 0, 90]
+max_movement = 3
+
+# the precomputed tables of a Simulator
+TABLES = ['distance', 'sensing', 'transition', 'stopped']
+
+class Simulator(object):
+    def __init__(self, maze, distance=None):
+        '''
+        Precomputes the robot motion over a maze so that a time step is a
+        table lookup instead of walking the walls cell by cell.
+
+        A robot pose is packed into one integer state:
+
+            state = (x * dim + y) * 4 + heading
+
+        - distance: (dim, dim, 4) open cells to the nearest wall for each
+            cell and heading (this can be given when it is already known).
+        - sensing: (states, 3) left, front, right sensor readings.
+        - transition: (states, 3, 7) next state for each rotation index
+            (see rotations) and movement in [-3, 3].
+        - stopped: (states, 3, 7) True when a wall stopped the movement.
+        '''
+        self.dim = maze.dim
+        if distance is None:
+            distance = Simulator.distances(maze.walls)
+        self.distance = distance
+
+        dim = self.dim
+        states = dim * dim * 4
+        x, y, heading = np.unravel_index(np.arange(states), (dim, dim, 4))
+        dist = distance.reshape(states / 4, 4)[x * dim + y]
+
+        # sensors are to the left, front, right of the heading
+        self.sensing = np.empty((states, 3), dtype=distance.dtype)
+        for i in range(3):
+            self.sensing[:, i] = dist[np.arange(states), (heading + i - 1) % 4]
+
+        self.transition = np.empty((states, len(rotations), 2 * max_movement + 1), dtype=np.int32)
+        self.stopped = np.empty((states, len(rotations), 2 * max_movement + 1), dtype=bool)
+        delta = np.array(heading_move)
+        for r in range(len(rotations)):
+            new_heading = (heading + r - 1) % 4
+            for movement in range(-max_movement, max_movement + 1):
+                # moving backwards is moving along the reversed heading
+                direction = new_heading if movement >= 0 else (new_heading + 2) % 4
+                open_cells = dist[np.arange(states), direction]
+                steps = np.minimum(abs(movement), open_cells)
+                x2 = x + delta[direction, 0] * steps
+                y2 = y + delta[direction, 1] * steps
+                self.transition[:, r, movement + max_movement] = (x2 * dim + y2) * 4 + new_heading
+                self.stopped[:, r, movement + max_movement] = abs(movement) > open_cells
+
+    # simulator over tables computed elsewhere (e.g. views of shared memory)
+    # - tables: name => array for distance, sensing, transition and stopped
+    @staticmethod
+    def attach(tables):
+        simulator = Simulator.__new__(Simulator)
+        simulator.dim = tables['distance'].shape[0]
+        for name in TABLES:
+            setattr(simulator, name, tables[name])
+        return simulator
+
+    # number of open cells to the nearest wall for every cell and heading
+    @staticmethod
+    def distances(walls):
+        dim = walls.shape[0]
+        distance = np.zeros((dim, dim, 4), dtype=np.int32)
+        for h in range(4):
+            dx, dy = heading_move[h]
+            is_open = (walls & 2**h) != 0
+            # sweep from the far wall back so each cell adds one to its neighbor
+            order = range(dim) if dx + dy < 0 else range(dim - 1, -1, -1)
+            for i in order:
+                if dx != 0:
+                    prev = distance[i + dx, :, h] if 0 <= i + dx < dim else 0
+                    distance[i, :, h] = np.where(is_open[i, :], prev + 1, 0)
+                else:
+                    prev = distance[:, i + dy, h] if 0 <= i + dy < dim else 0
+                    distance[:, i, h] = np.where(is_open[:, i], prev + 1, 0)
+        return distance
+
+    def state(self, location, heading):
+        return (location[0] * self.dim + location[1]) * 4 + heading_index[heading]
+
+    # returns ([x, y], heading) of a state
+    def pose(self, state):
+        cell, heading = divmod(int(state), 4)
+        return list(divmod(cell, self.dim)), headings[heading]
+
+    # sensor readings (left, front, right) at a state
+    def sense(self, state):
+        return self.sensing[state]
+
+    # returns (next state, stopped by wall) - works on scalars and arrays alike
+    def move(self, state, rotation, movement):
+        r = np.asarray(rotation) / 90 + 1
+        m = np.asarray(movement) + max_movement
+        return self.transition[state, r, m], self.stopped[state, r, m]
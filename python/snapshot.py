@@ -0,0 +1,86 @@
+from util import *
+from files import replaceFile
+import struct
+
+"""
+Binary snapshot of what a robot has learned about a maze
+- a fixed header (magic, version, rows, cols and the SHA-1 of the maze walls,
+  zeros if the maze is unknown) followed by one array per kind of knowledge,
+  each rows x cols in row major order:
+  - maze: the Mapper wall bits (-1 for unknown cells)
+  - deadEnds: a dead end bit per direction (2**Direction.value)
+  - counter: the visit counts
+  - heuristic: the heuristic values
+- loading maps the file into memory, so the arrays are read-only views of the
+  file and nothing is copied until knowledge is restored into a robot
+"""
+class Snapshot(object):
+    MAGIC = 'MOUSESNP'
+    VERSION = 2
+    HEADER = struct.Struct('<8sIII20s')
+    HEADER_SIZE = 64
+    ARRAYS = [('maze', np.int8), ('deadEnds', np.uint8), ('counter', np.int32), ('heuristic', np.int32)]
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            magic, version, rows, cols, identity = Snapshot.HEADER.unpack(f.read(Snapshot.HEADER.size))
+        if magic != Snapshot.MAGIC:
+            raise Exception('Not a robot snapshot: {}'.format(filename))
+        if version != Snapshot.VERSION:
+            raise Exception('Unsupported snapshot version {} (expected {})'.format(version, Snapshot.VERSION))
+        # the maze the knowledge is about (None if unknown)
+        self.identity = identity.encode('hex') if identity.strip('\0') else None
+        self.rows, self.cols = rows, cols
+        self.shape = (rows, cols)
+        for name, dtype, offset in Snapshot.layout(rows, cols):
+            setattr(self, name, np.memmap(filename, dtype=np.dtype(dtype).newbyteorder('<'),
+                                          mode='r', offset=offset, shape=(rows, cols)))
+
+    # (name, dtype, offset) of each array (offsets are 8 byte aligned)
+    @staticmethod
+    def layout(rows, cols):
+        offset = Snapshot.HEADER_SIZE
+        result = []
+        for name, dtype in Snapshot.ARRAYS:
+            result.append((name, dtype, offset))
+            offset += (rows*cols*np.dtype(dtype).itemsize + 7) // 8 * 8
+        return result
+
+    @staticmethod
+    def isSnapshot(filename):
+        with open(filename, 'rb') as f:
+            return f.read(len(Snapshot.MAGIC)) == Snapshot.MAGIC
+
+    # write the robot knowledge
+    @staticmethod
+    def save(filename, robot):
+        rows, cols = robot.maze.shape
+        arrays = {
+            'maze'      : robot.maze.array(),
+            'deadEnds'  : robot.deadEnds.mask(),
+            'counter'   : robot.counter.array(),
+            'heuristic' : robot.heuristic.array(),
+        }
+        with replaceFile(filename) as f:
+            identity = robot.identity.decode('hex') if robot.identity else ''
+            f.write(Snapshot.HEADER.pack(Snapshot.MAGIC, Snapshot.VERSION, rows, cols, identity).ljust(Snapshot.HEADER_SIZE, '\0'))
+            for name, dtype, offset in Snapshot.layout(rows, cols):
+                f.seek(offset)
+                f.write(arrays[name].astype(np.dtype(dtype).newbyteorder('<')).tobytes())
+
+    # a Mapper with the mapped walls (e.g. for the planner)
+    def mapper(self):
+        maze = Mapper(self.rows, self.cols)
+        maze.grid = self.maze.tolist()
+        return maze
+
+    # copy the knowledge into the robot utilities
+    def restore(self, robot):
+        if robot.maze.shape != self.shape:
+            raise Exception('Snapshot is for a {}x{} maze'.format(self.rows, self.cols))
+        robot.maze.grid = self.maze.tolist()
+        for d in Direction:
+            marks = (self.deadEnds >> d.value) & 1
+            robot.deadEnds.deadEndsMap[d].grid = [['X' if m else '_' for m in row] for row in marks.tolist()]
+        robot.counter.grid = self.counter.tolist()
+        robot.heuristic.grid = self.heuristic.tolist()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# the command line scripts and their modules
+SCRIPTS = ['tester', 'planner', 'tournament', 'render', 'showmaze', 'mazeindex', 'viewer']
+
+# project modules (reported when a script imports them at startup)
+PROJECT = ['files', 'util', 'metrics', 'maze', 'simulator', 'graph', 'controller', 'planner', 'robot',
+           'snapshot', 'render', 'corpus', 'ring', 'mazeindex', 'tester', 'tournament']
+
+"""
+Startup time of the command line scripts
+- each script module is imported (without running its main part) in a fresh
+  interpreter several times and the median wall time is reported, along with
+  the interpreter alone as the baseline
+- the modules loaded at startup show what each script pays for before it runs
+  (numpy alone is measured too as every script needs it)
+"""
+def measure(statement, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', statement], cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.time() - start)
+    times.sort()
+    return times[len(times)/2]
+
+# (number of modules, project modules, numpy loaded) after importing a script
+def modules(script):
+    statement = 'import sys; import {}; print len(sys.modules); print " ".join(sorted(sys.modules))'.format(script)
+    output = subprocess.check_output([sys.executable, '-c', statement], cwd=os.path.dirname(os.path.abspath(__file__)))
+    count, names = output.splitlines()
+    names = set(names.split())
+    return int(count), [m for m in PROJECT if m in names and m!=script], 'numpy' in names
+
+if __name__ == '__main__':
+    '''
+    Measures the startup (interpreter plus import) time of each command line
+    script in milliseconds.
+    '''
+    parser = argparse.ArgumentParser(description='startup time of the command line scripts')
+    parser.add_argument('scripts', nargs='*', default=SCRIPTS, help='script modules')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='runs per script')
+    args = parser.parse_args()
+
+    baseline = measure('pass', args.repeat)
+    print '{:<12} {:>8} {:>8} {:>8}  {}'.format('script', 'total', 'imports', 'modules', 'project modules')
+    print '{:<12} {:8.1f} {:>8} {:>8}'.format('(python)', baseline*1000, '-', '-')
+    total = measure('import numpy', args.repeat)
+    print '{:<12} {:8.1f} {:8.1f} {:>8}'.format('(numpy)', total*1000, (total-baseline)*1000, '-')
+    for script in args.scripts:
+        total = measure('import {}'.format(script), args.repeat)
+        count, project, numpy = modules(script)
+        print '{:<12} {:8.1f} {:8.1f} {:8d}  {}{}'.format(
+            script, total*1000, (total-baseline)*1000, count, ' '.join(project), ' (numpy)' if numpy else '')
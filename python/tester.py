@@ -1,32 +1,25 @@
 from maze import Maze
 from robot import Robot
+from simulator import Simulator, heading_index
+import metrics
+import os
 import sys
 
-# global dictionaries for robot movement and sensing
-dir_sensors = {'u': ['l', 'u', 'r'], 'r': ['u', 'r', 'd'],
-               'd': ['r', 'd', 'l'], 'l': ['d', 'l', 'u'],
-               'up': ['l', 'u', 'r'], 'right': ['u', 'r', 'd'],
-               'down': ['r', 'd', 'l'], 'left': ['d', 'l', 'u']}
-dir_move = {'u': [0, 1], 'r': [1, 0], 'd': [0, -1], 'l': [-1, 0],
-            'up': [0, 1], 'right': [1, 0], 'down': [0, -1], 'left': [-1, 0]}
-dir_reverse = {'u': 'd', 'r': 'l', 'd': 'u', 'l': 'r',
-               'up': 'd', 'right': 'l', 'down': 'u', 'left': 'r'}
-
 # test and score parameters
 max_time = 1000
 train_score_mult = 1/30.
 
-if __name__ == '__main__':
+def evaluate(testmaze, testrobot, simulator=None, record=None, ring=None):
     '''
-    This script tests a robot based on the code in robot.py on a maze given
-    as an argument when running the script.
+    Tests a robot on a maze over two runs and returns the list of run times
+    (the list has two entries only when the robot completed both runs).
+    The robot poses are appended to the record list as (run, state) if given.
+    The poses and sensor readings are published to the ring buffer if given.
     '''
 
-    # Create a maze based on input argument on command line.
-    testmaze = Maze( str(sys.argv[1]) )
-
-    # Intitialize a robot; robot receives info about maze dimensions.
-    testrobot = Robot(testmaze.dim)
+    # Precompute the robot motion over the maze.
+    if simulator is None:
+        simulator = Simulator(testmaze)
 
     # Record robot performance over two runs.
     runtimes = []
@@ -36,7 +29,11 @@ if __name__ == '__main__':
 
         # Set the robot in the start position. Note that robot position
         # parameters are independent of the robot itself.
-        robot_pos = {'location': [0, 0], 'heading': 'up'}
+        robot_state = simulator.state([0, 0], 'up')
+        if record is not None:
+            record.append((run, robot_state))
+        if ring is not None:
+            publish(ring, simulator, run, total_time, robot_state, 0, 0, False)
 
         run_active = True
         hit_goal = False
@@ -47,10 +44,10 @@ if __name__ == '__main__':
                 run_active = False
                 print "Allotted time exceeded."
                 break
+            metrics.STEPS.inc(run=run)
 
             # provide robot with sensor information, get actions
-            sensing = [testmaze.dist_to_wall(robot_pos['location'], heading)
-                       for heading in dir_sensors[robot_pos['heading']]]
+            sensing = simulator.sense(robot_state).tolist()
             rotation, movement = testrobot.next_move(sensing)
 
             # check for a reset
@@ -58,6 +55,7 @@ if __name__ == '__main__':
                 if run == 0 and hit_goal:
                     run_active = False
                     runtimes.append(total_time)
+                    metrics.RUN_STEPS.observe(total_time, run=run)
                     print "Ending first run. Starting next run."
                     break
                 elif run == 0 and not hit_goal:
@@ -67,48 +65,96 @@ if __name__ == '__main__':
                     print "Cannot reset on runs after the first."
                     continue
 
-            # perform rotation
-            if rotation == -90:
-                robot_pos['heading'] = dir_sensors[robot_pos['heading']][0]
-            elif rotation == 90:
-                robot_pos['heading'] = dir_sensors[robot_pos['heading']][2]
-            elif rotation == 0:
-                pass
-            else:
+            # check rotation
+            if rotation not in (-90, 0, 90):
                 print "Invalid rotation value, no rotation performed."
+                rotation = 0
 
-            # perform movement
+            # perform rotation and movement in one lookup
             if abs(movement) > 3:
                 print "Movement limited to three squares in a turn."
             movement = max(min(int(movement), 3), -3) # fix to range [-3, 3]
-            while movement:
-                if movement > 0:
-                    if testmaze.is_permissible(robot_pos['location'], robot_pos['heading']):
-                        robot_pos['location'][0] += dir_move[robot_pos['heading']][0]
-                        robot_pos['location'][1] += dir_move[robot_pos['heading']][1]
-                        movement -= 1
-                    else:
-                        print "Movement stopped by wall."
-                        movement = 0
-                else:
-                    rev_heading = dir_reverse[robot_pos['heading']]
-                    if testmaze.is_permissible(robot_pos['location'], rev_heading):
-                        robot_pos['location'][0] += dir_move[rev_heading][0]
-                        robot_pos['location'][1] += dir_move[rev_heading][1]
-                        movement += 1
-                    else:
-                        print "Movement stopped by wall."
-                        movement = 0
+            robot_state, stopped = simulator.move(robot_state, rotation, movement)
+            if stopped:
+                print "Movement stopped by wall."
+                metrics.WALL_STOPS.inc(run=run)
+            metrics.MOVES.inc(run=run, kind='turn' if rotation else 'straight' if movement else 'idle')
+            if record is not None:
+                record.append((run, robot_state))
+            if ring is not None:
+                publish(ring, simulator, run, total_time, robot_state, rotation, movement, stopped)
 
             # check for goal entered
+            location, heading = simulator.pose(robot_state)
             goal_bounds = [testmaze.dim/2 - 1, testmaze.dim/2]
-            if robot_pos['location'][0] in goal_bounds and robot_pos['location'][1] in goal_bounds:
+            if location[0] in goal_bounds and location[1] in goal_bounds:
                 hit_goal = True
                 if run != 0:
                     runtimes.append(total_time - sum(runtimes))
+                    metrics.RUN_STEPS.observe(runtimes[-1], run=run)
+                    metrics.SCORE.observe(score(runtimes))
                     run_active = False
                     print "Goal found; run {} completed!".format(run)
 
+    return runtimes
+
+# publish a pose with its sensor readings to a ring buffer
+def publish(ring, simulator, run, time, state, rotation, movement, stopped):
+    location, heading = simulator.pose(state)
+    left, front, right = simulator.sense(state)
+    ring.publish(run, time, location[0], location[1], heading_index[heading],
+                 left, front, right, rotation, movement, stopped)
+
+# score is the 2nd run time plus the 1st run time weighted by train_score_mult
+def score(runtimes):
+    return runtimes[1] + train_score_mult*runtimes[0]
+
+if __name__ == '__main__':
+    '''
+    This script tests a robot based on the code in robot.py on a maze given
+    as an argument when running the script.
+    '''
+
+    # Create a maze based on input argument on command line.
+    testmaze = Maze( str(sys.argv[1]) )
+
+    # Intitialize a robot; robot receives info about maze dimensions (and the
+    # maze identity for its snapshot).
+    testrobot = Robot(testmaze.dim, identity=testmaze.identity())
+
+    # the robot poses are written to a file given in an env var 'RECORD'
+    # (one 'run x y heading' line per time step)
+    simulator = Simulator(testmaze)
+    record = [] if os.environ.get('RECORD') else None
+
+    # the poses and sensor readings are published to a ring buffer file given
+    # in an env var 'RING' for a live viewer (viewer.py)
+    ring = None
+    if os.environ.get('RING'):
+        from ring import RingBuffer
+        ring = RingBuffer.create(os.environ['RING'], testmaze.walls)
+
+    runtimes = evaluate(testmaze, testrobot, simulator, record, ring)
+
+    if record is not None:
+        with open(os.environ['RECORD'], 'w') as f:
+            for run, state in record:
+                location, heading = simulator.pose(state)
+                f.write('{} {} {} {}\n'.format(run, location[0], location[1], heading))
+
     # Report score if robot is successful.
     if len(runtimes) == 2:
-        print "Task complete! Score: {:4.3f}".format(runtimes[1] + train_score_mult*runtimes[0])
\ No newline at end of file
+        print "Task complete! Score: {:4.3f}".format(score(runtimes))
+
+        # compare with the best score from the maze index (mazeindex.py) if
+        # the maze is indexed
+        from mazeindex import MazeIndex
+        entry = MazeIndex.lookup(sys.argv[1])
+        if entry is not None and entry['oracle_score']:
+            print "Oracle ratio: {:4.3f} (oracle score {:4.3f})".format(
+                score(runtimes)/entry['oracle_score'], entry['oracle_score'])
+
+    # the run metrics are written to a file given in an env var 'METRICS'
+    # (JSON for a .json file, the Prometheus text format otherwise)
+    if os.environ.get('METRICS'):
+        metrics.registry.write(os.environ['METRICS'])
@@ -0,0 +1,204 @@
+from maze import Maze
+from robot import Robot
+from simulator import Simulator
+from controller import Controllers
+import metrics
+import tester
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import time
+
+"""
+Results store (SQLite) with one row per controller x maze x seed
+"""
+class Results(object):
+    def __init__(self, filename):
+        self.db = sqlite3.connect(filename)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                controller TEXT NOT NULL,
+                maze       TEXT NOT NULL,
+                seed       INTEGER NOT NULL,
+                score      REAL,
+                first_run  INTEGER,
+                second_run INTEGER,
+                error      TEXT,
+                PRIMARY KEY (controller, maze, seed))''')
+        self.db.commit()
+
+    # the (controller, maze, seed) cells already finished (errors are run again)
+    def finished(self):
+        return set(self.db.execute('SELECT controller, maze, seed FROM results WHERE error IS NULL'))
+
+    # store one result as soon as it arrives so an interrupted sweep can resume
+    def add(self, result):
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?,?,?,?,?,?,?)', result)
+        self.db.commit()
+
+    # (maze, controller, mean score, completed runs, runs) ranked per maze by
+    # completion rate first and then by mean score over the completed runs
+    def summary(self):
+        return self.db.execute('''
+            SELECT maze, controller, AVG(score), COUNT(score), COUNT(*)
+            FROM results
+            GROUP BY maze, controller
+            ORDER BY maze, 1.0*COUNT(score)/COUNT(*) DESC, AVG(score) IS NULL, AVG(score)''').fetchall()
+
+    def close(self):
+        self.db.close()
+
+# mazes (and their simulators) already loaded by this worker process
+loaded = {}
+
+# maze corpus shared by the parent process (see --shared)
+corpus = None
+
+def load(filename):
+    if corpus is not None and filename in corpus:
+        return corpus.load(filename)
+    if filename not in loaded:
+        maze = Maze(filename)
+        loaded[filename] = (maze, Simulator(maze))
+    return loaded[filename]
+
+# workers do not print the robot logs
+def quiet():
+    sys.stdout = open(os.devnull, 'w')
+
+# worker initializer - the shared corpus is inherited by the forked worker
+def attach(shared):
+    global corpus
+    corpus = shared
+    quiet()
+
+# mazes are stored by their path relative to the working directory (file
+# names alone can be the same in different directories)
+def mazeKey(filename):
+    return os.path.relpath(filename)
+
+# runs one tournament cell and returns the row for the results store
+# with the metrics of the run (as a dump to merge)
+def play(task):
+    controller_name, filename, seed = task
+    key = (controller_name, mazeKey(filename), seed)
+    metrics.registry.clear()
+    try:
+        random.seed(seed)
+        testmaze, simulator = load(filename)
+        testrobot = Robot(testmaze.dim, controller_name, identity=testmaze.identity())
+        runtimes = tester.evaluate(testmaze, testrobot, simulator)
+    except Exception as e:
+        metrics.TRIALS.inc(status='error')
+        row = key + (None, None, None, '{}: {}'.format(e.__class__.__name__, e))
+        return row, metrics.registry.dump()
+    if len(runtimes) == 2:
+        metrics.TRIALS.inc(status='complete')
+        row = key + (tester.score(runtimes), runtimes[0], runtimes[1], None)
+    else:
+        metrics.TRIALS.inc(status='timeout')
+        row = key + (None, runtimes[0] if runtimes else None, None, None)
+    return row, metrics.registry.dump()
+
+# oracles: maze (as stored) => the best score from the maze index (ratios are shown for these)
+def report(results, oracles={}):
+    maze = None
+    for row in results.summary():
+        if row[0] != maze:
+            maze = row[0]
+            rank = 0
+            oracle = oracles.get(maze)
+            print '-- {} --'.format(maze) if oracle is None else '-- {} (oracle {:.3f}) --'.format(maze, oracle)
+        rank += 1
+        mean = '{:8.3f}'.format(row[2]) if row[2] is not None else '       -'
+        if oracle is not None and row[2] is not None:
+            mean += ' x{:.3f}'.format(row[2]/oracle)
+        print '{:2d} {:<10} {} ({}/{} completed)'.format(rank, row[1], mean, row[3], row[4])
+
+if __name__ == '__main__':
+    '''
+    Runs every controller on every maze with every seed on a worker pool.
+    Results are written to the SQLite file as they finish, and cells already
+    in the file are skipped so an interrupted sweep resumes where it stopped.
+    '''
+    parser = argparse.ArgumentParser(description='controller x maze x seed tournament')
+    parser.add_argument('results', help='SQLite results file')
+    parser.add_argument('mazes', nargs='*', help='maze files')
+    parser.add_argument('-c', '--controllers', nargs='+', default=sorted(Controllers),
+                        choices=sorted(Controllers))
+    parser.add_argument('-s', '--seeds', type=int, default=10, help='number of seeds')
+    parser.add_argument('-p', '--processes', type=int, default=None, help='worker processes')
+    parser.add_argument('--shared', action='store_true',
+                        help='load the mazes and their tables once into shared memory for the workers')
+    parser.add_argument('--metrics', help='file for the metrics aggregated over the runs '
+                                          '(JSON for .json, the Prometheus text format otherwise)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve the aggregated metrics at /metrics and /metrics.json '
+                             '(and keep serving after the sweep until interrupted)')
+    args = parser.parse_args()
+
+    results = Results(args.results)
+    finished = results.finished()
+    tasks = [(c, m, s) for c in args.controllers for m in args.mazes for s in range(args.seeds)
+             if (c, mazeKey(m), s) not in finished]
+    print '{} runs to go ({} finished)'.format(len(tasks), len(finished))
+
+    # the metrics of the runs in this sweep are aggregated by controller and maze
+    server = None
+    if args.metrics_port is not None:
+        server = metrics.registry.serve(args.metrics_port)
+        print 'Serving metrics on port {}'.format(args.metrics_port)
+
+    if tasks:
+        if args.shared:
+            from corpus import SharedCorpus
+            shared = SharedCorpus(sorted(set(m for c, m, s in tasks)))
+            print '{} mazes in {} bytes of shared memory'.format(len(shared), shared.nbytes())
+            pool = multiprocessing.Pool(args.processes, initializer=attach, initargs=(shared,))
+        else:
+            pool = multiprocessing.Pool(args.processes, initializer=quiet)
+        try:
+            for i, (result, dump) in enumerate(pool.imap_unordered(play, tasks)):
+                results.add(result)
+                metrics.registry.merge(dump, controller=result[0], maze=result[1])
+                if args.metrics:
+                    metrics.registry.write(args.metrics)
+                sys.stdout.write('\r{}/{}'.format(i+1, len(tasks)))
+                sys.stdout.flush()
+            print
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            print
+            print 'Interrupted - run again to resume.'
+        pool.join()
+
+    # the oracle scores come from the maze index of each maze directory
+    # (built or brought up to date here - only changed files are measured,
+    # and a directory that can not be written to is only not saved)
+    from mazeindex import MazeIndex
+    oracles = {}
+    for directory in sorted(set(os.path.dirname(m) or '.' for m in args.mazes)):
+        index = MazeIndex(directory)
+        try:
+            index.update()
+        except (IOError, OSError) as e:
+            print 'Maze index not saved: {}'.format(e)
+        for name, entry in index.entries.items():
+            if entry['dim'] is None:
+                continue # not a maze
+            oracles[mazeKey(os.path.join(directory, name))] = entry['oracle_score']
+
+    report(results, oracles)
+    results.close()
+
+    if server is not None:
+        try:
+            print 'Still serving metrics - press Ctrl-C to stop.'
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -1,4 +1,5 @@
 import copy
+import metrics
 import numpy as np
 from enum import Enum
 
@@ -152,7 +153,11 @@ class Grid(object):
     def __init__(self, rows, cols ,init_val):
         self.rows = rows
         self.cols = cols
-        self.grid = [ [ copy.deepcopy(init_val) for c in range(cols) ] for r in range(rows) ]
+        if isinstance(init_val, (int, long, float, basestring)):
+            # immutable values can be shared by the cells
+            self.grid = [ [ init_val ] * cols for r in range(rows) ]
+        else:
+            self.grid = [ [ copy.deepcopy(init_val) for c in range(cols) ] for r in range(rows) ]
         self.shape = (rows, cols)
         self.data_type = type(init_val)
 
@@ -169,6 +174,9 @@ class Grid(object):
         row, col = location
         return 0 <= row and row < self.rows and 0 <= col and col < self.cols
 
+    def array(self):
+        return np.array(self.grid)
+
     def area(self):
         return self.rows * self.cols
 
@@ -184,6 +192,11 @@ Maps the maze
 class Mapper(Grid):
     def __init__(self, rows, cols):
         Grid.__init__(self, rows, cols, -1) 
+        self.changes = [] # locations in the order they were (re)mapped by expand
+
+    # the number of changes made by expand (identifies a state of the mapping)
+    def version(self):
+        return len(self.changes)
 
     # this method is used by the A* search test program to read the test maze file
     @staticmethod
@@ -218,10 +231,13 @@ class Mapper(Grid):
             if sensor.distance(s)>0:
                 i = heading.direction.adjust(s).value
                 value += 2**i
-        # We don't have a back sensor.  Use the value already mapped for the back.
+        # We don't have a back sensor.  Use the value already mapped for the back
+        # (from this cell when revisited, otherwise from the cell behind).
         backward = heading.backward()
-        if self.canMove(backward.reverse()):
+        if self.canMove(heading.reverse()) or self.canMove(backward.reverse()):
             value += 2**backward.direction.value
+        if value != self.getValue(heading.location):
+            self.changes.append(tuple(heading.location))
         self.setValue(heading.location, value)
 
     # return True if we can move to a direction at a location specified in a Heading value
@@ -284,6 +300,13 @@ class DeadEnds(object):
             return deadEnds.getValue(heading.location)=='X'
         return False
 
+    # dead ends as a numpy array with a bit per direction (2**Direction.value)
+    def mask(self):
+        mask = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        for d in Direction:
+            mask |= (self.deadEndsMap[d].array()=='X').astype(np.uint8) << d.value
+        return mask
+
     def __str__(self):
         grid = Grid(self.rows, self.cols, '_')
         for d in Direction:
@@ -315,6 +338,65 @@ class Counter(Grid):
         values = np.array([self.grid[r][c] for r in range(rows) for c in range(cols) if self.grid[r][c]>0])
         return 100.0*len(values)/self.area(), np.average(values), np.std(values)
 
+"""
+Distance field over a (partially) mapped maze
+- a flood fill from the source cells (the goal room by default) that expands
+  one whole layer of the queue at a time using the wall bits
+- known cells move through their open sides; unknown cells move to any
+  neighbor when openUnknown is True, otherwise they are never entered
+- the values are those of the first-in-first-out queue that sets a cell when
+  it is dequeued: a cell that is queued again by a neighbor dequeued before
+  it (in the same layer) ends up one more than its layer (exact=True gives
+  the plain breadth first distances instead)
+- returns a numpy array of distances (-1 where the fill did not reach)
+"""
+def distanceField(maze, sources=None, openUnknown=True, exact=False):
+    rows, cols = maze.shape
+    if sources is None:
+        sources = [(rows/2+r-1, cols/2+c-1) for r in range(2) for c in range(2)]
+
+    walls = maze.array().ravel()
+    unknown = walls == -1
+    index = np.arange(rows*cols)
+    row, col = index // cols, index % cols
+    inside = [row > 0, col < cols-1, row < rows-1, col > 0] # per Direction
+    offset = np.array([-cols, 1, cols, -1])
+    canMove = np.empty((rows*cols, 4), dtype=bool)
+    for d in Direction:
+        known = ~unknown & ((walls & 2**d.value) > 0)
+        canMove[:, d.value] = inside[d.value] & ((known | unknown) if openUnknown else known)
+    if not openUnknown:
+        canMove &= ~unknown[np.clip(index[:, None] + offset, 0, rows*cols-1)]
+
+    field = np.full(rows*cols, -1, dtype=np.int32)
+    position = np.full(rows*cols, -1, dtype=np.int64)
+    layer = np.array([r*cols+c for r, c in sources], dtype=np.int64)
+    if not openUnknown:
+        layer = layer[~unknown[layer]]
+    field[layer] = 0
+    h = 0
+    while len(layer)>0:
+        # queue order of the layer (only the first entry of a cell matters)
+        position[layer] = np.arange(len(layer))
+        # children in queue order: by parent position then by Direction
+        children = (layer[:, None] + offset).ravel()
+        parent = np.repeat(np.arange(len(layer)), 4)
+        valid = canMove[layer].ravel()
+        children, parent = children[valid], parent[valid]
+        # a child is queued while it has not been dequeued yet
+        if exact:
+            queued = (field[children]==-1) & (position[children]<0)
+        else:
+            queued = (field[children]==-1) & ~((position[children]>=0) & (position[children]<parent))
+        children = children[queued]
+        position[layer] = -1
+        field[layer] = h
+        h += 1
+        # keep the first entry of each child in queue order
+        _, first = np.unique(children, return_index=True)
+        layer = children[np.sort(first)]
+    return field.reshape(rows, cols)
+
 """
 Heuristic
 """
@@ -322,26 +404,6 @@ class Heuristic(Grid):
     def __init__(self, maze):
         rows, cols = maze.shape
         Grid.__init__(self, rows, cols, -1)
-
-        # set center values to zero
-        open = []
-        for r in range(2):
-            for c in range(2):
-                l = (rows/2+r-1, cols/2+c-1)
-                open.append((0,l))
-                self.setValue(l, 0)
-
-        # expand from the center
-        while len(open)>0:
-            h,l = open.pop(0)
-            self.setValue(l, h)
-
-            isUnknown = maze.isUnknown(l)
-            for d2 in Direction:
-                delta = d2.delta() 
-                l2 = (l[0]+delta[0], l[1]+delta[1])
-                # we can move or unknown teritory
-                if maze.canMove(Heading(d2, l)) or (isUnknown and self.isValid(l2)):
-                    v2 = self.getValue(l2)
-                    if v2==-1:
-                        open.append((h+1,l2))
+        # distance from the center
+        self.grid = distanceField(maze).tolist()
+        metrics.HEURISTICS.inc()
@@ -0,0 +1,103 @@
+from ring import RingBuffer
+import os
+import sys
+import time
+
+# robot marks by heading index (up, right, down, left)
+MARKS = ['^', '>', 'v', '<']
+
+"""
+Live text view of a run read from the tester ring buffer
+- the maze is drawn with the robot, its trail of the current run and a status
+  line; only the latest updates are read on each frame, so the viewer never
+  slows the robot down and simply skips what it has no time to show
+"""
+class Viewer(object):
+    def __init__(self, ring, trail=50):
+        self.ring = ring
+        self.dim = ring.dim
+        self.walls = ring.walls()
+        self.trail = []
+        self.length = trail
+        self.record = None
+        self.sequence = 0
+
+    # read the updates since the last frame (returns True when there are any)
+    def update(self):
+        records = self.ring.since(self.sequence)
+        if len(records)==0:
+            return False
+        for record in records:
+            if self.record is not None and record['run'] != self.record['run']:
+                self.trail = []
+            self.trail.append((record['x'], record['y']))
+            self.record = record
+        self.trail = self.trail[-self.length:]
+        self.sequence = records[-1]['sequence']
+        return True
+
+    # the maze as text lines (3 characters per cell, y going up)
+    def lines(self):
+        marks = dict((cell, '.') for cell in self.trail)
+        record = self.record
+        if record is not None:
+            marks[(record['x'], record['y'])] = MARKS[record['heading']]
+        lines = []
+        for y in range(self.dim-1, -1, -1):
+            top = '+'
+            row = ''
+            for x in range(self.dim):
+                value = self.walls[x][y]
+                top += ('  ' if value & 1 else '--') + '+'
+                row += (' ' if value & 8 else '|') + marks.get((x, y), ' ') + ' '
+            lines.append(top)
+            lines.append(row + ('|' if self.walls[self.dim-1][y] & 2 == 0 else ' '))
+        lines.append('+' + '--+' * self.dim)
+        return lines
+
+    def status(self):
+        record = self.record
+        if record is None:
+            return 'waiting for the robot...'
+        return 'run {run} time {time:3d} @ ({x:2d},{y:2d}) sensors [{left:2d},{front:2d},{right:2d}] ' \
+               'move {rotation:3d},{movement:2d}{wall}'.format(wall=' (wall)' if record['stopped'] else '', **record)
+
+# wait for the ring buffer file of a run
+def attach(filename):
+    while True:
+        try:
+            return RingBuffer(filename)
+        except (IOError, OSError, ValueError):
+            time.sleep(0.1)
+
+if __name__ == '__main__':
+    '''
+    Shows a run live in the terminal at its own frame rate. The tester
+    publishes the robot updates to the ring buffer file given by RING:
+
+        RING=/dev/shm/mouse.ring ./run.sh heuristic 03
+        python python/viewer.py /dev/shm/mouse.ring
+
+    It follows the next run when the file is replaced and stops with Ctrl-C.
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='live viewer of the tester ring buffer')
+    parser.add_argument('ring', help='ring buffer file (RING env var of the tester)')
+    parser.add_argument('--fps', type=float, default=10, help='frames per second')
+    parser.add_argument('--trail', type=int, default=50, help='trail length in updates')
+    args = parser.parse_args()
+
+    viewer = Viewer(attach(args.ring), args.trail)
+    try:
+        while True:
+            start = time.time()
+            if viewer.ring.replaced():
+                viewer.ring.close()
+                viewer = Viewer(attach(args.ring), args.trail)
+            viewer.update()
+            # redraw in place (cursor home, clear to the end)
+            sys.stdout.write('\x1b[H\x1b[J' + '\n'.join(viewer.lines() + [viewer.status()]) + '\n')
+            sys.stdout.flush()
+            time.sleep(max(0, 1.0/args.fps - (time.time() - start)))
+    except KeyboardInterrupt:
+        pass